@@ -1,7 +1,21 @@
-from cProfile import label
-import rclpy
-
+from collections import deque
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import inspect
+import json
+import threading
+import time
+
+from rclpy.callback_groups import ReentrantCallbackGroup
 from rclpy.node import Node
+from rclpy.qos import DurabilityPolicy
+from rclpy.qos import QoSProfile
+from rclpy.task import Future
+
+from diagnostic_msgs.msg import DiagnosticArray
+
+from rcl_interfaces.msg import SetParametersResult
 
 from lifecycle_msgs.msg import State
 from lifecycle_msgs.msg import Transition
@@ -13,518 +27,833 @@ from lifecycle_msgs.srv import GetAvailableStates
 from lifecycle_msgs.srv import GetAvailableTransitions
 from lifecycle_msgs.srv import GetState
 
+from std_srvs.srv import Trigger
+
+from ros2_lifecycle_py.lifecycle_checkpoint import Checkpoint
+from ros2_lifecycle_py.lifecycle_core import LifecycleStateMachine
+from ros2_lifecycle_py.lifecycle_core import STATE_NAMES
+from ros2_lifecycle_py.lifecycle_core import TRANSITION_NAMES
+from ros2_lifecycle_py.lifecycle_heartbeat import Heartbeat
+from ros2_lifecycle_py.lifecycle_statistics import TransitionStatistics
+from ros2_lifecycle_py.managed_entities import LifecyclePublisher
+from ros2_lifecycle_py.managed_entities import LifecycleSubscription
+from ros2_lifecycle_py.managed_entities import LifecycleTimer
+
+
+_LABELS = {
+    State: STATE_NAMES,
+    Transition: TRANSITION_NAMES,
+}
+_STATE_LABELS = _LABELS[State]
+_TRANSITION_LABELS = _LABELS[Transition]
+
+
+# (transition, label, start state, goal state) as advertised by
+# get_available_transitions.
+_AVAILABLE_TRANSITIONS = (
+    (Transition.TRANSITION_CREATE, 'create',
+        State.PRIMARY_STATE_UNKNOWN, State.PRIMARY_STATE_UNCONFIGURED),
+    (Transition.TRANSITION_CONFIGURE, 'configure',
+        State.PRIMARY_STATE_UNCONFIGURED, State.PRIMARY_STATE_INACTIVE),
+    (Transition.TRANSITION_ACTIVATE, 'activate',
+        State.PRIMARY_STATE_INACTIVE, State.PRIMARY_STATE_ACTIVE),
+    (Transition.TRANSITION_DEACTIVATE, 'deactivate',
+        State.PRIMARY_STATE_ACTIVE, State.PRIMARY_STATE_INACTIVE),
+    (Transition.TRANSITION_UNCONFIGURED_SHUTDOWN, 'shutdown',
+        State.PRIMARY_STATE_UNCONFIGURED, State.PRIMARY_STATE_FINALIZED),
+    (Transition.TRANSITION_INACTIVE_SHUTDOWN, 'shutdown',
+        State.PRIMARY_STATE_INACTIVE, State.PRIMARY_STATE_FINALIZED),
+    (Transition.TRANSITION_ACTIVE_SHUTDOWN, 'shutdown',
+        State.PRIMARY_STATE_ACTIVE, State.PRIMARY_STATE_FINALIZED),
+    (Transition.TRANSITION_CLEANUP, 'cleanup',
+        State.PRIMARY_STATE_INACTIVE, State.PRIMARY_STATE_UNCONFIGURED),
+)
+
+_AVAILABLE_STATES = (
+    State.PRIMARY_STATE_UNKNOWN,
+    State.PRIMARY_STATE_UNCONFIGURED,
+    State.PRIMARY_STATE_INACTIVE,
+    State.PRIMARY_STATE_ACTIVE,
+    State.PRIMARY_STATE_FINALIZED,
+    State.TRANSITION_STATE_CONFIGURING,
+    State.TRANSITION_STATE_CLEANINGUP,
+    State.TRANSITION_STATE_SHUTTINGDOWN,
+    State.TRANSITION_STATE_ACTIVATING,
+    State.TRANSITION_STATE_DEACTIVATING,
+    State.TRANSITION_STATE_ERRORPROCESSING,
+)
+
+_Catalog = namedtuple(
+    '_Catalog', ['states', 'transitions', 'available_states', 'available_transitions'])
+
+
+@lru_cache(maxsize=None)
+def _catalog():
+    # Built on first use and shared by every LifecycleNode in the process,
+    # the tuples and the messages in them must not be modified.
+    states = {
+        state_id: State(id=state_id, label=label) for state_id, label in _STATE_LABELS.items()
+    }
+
+    def state(state_id):
+        return states[state_id]
+
+    return _Catalog(
+        states=states,
+        transitions={
+            transition_id: Transition(id=transition_id, label=label)
+            for transition_id, label in _TRANSITION_LABELS.items()
+        },
+        available_states=tuple(state(state_id) for state_id in _AVAILABLE_STATES),
+        available_transitions=tuple(
+            TransitionDescription(
+                transition=Transition(id=transition_id, label=label),
+                start_state=state(start_state),
+                goal_state=state(goal_state))
+            for transition_id, label, start_state, goal_state in _AVAILABLE_TRANSITIONS))
 
-class LifecycleNode(Node):
 
-    
-    def __init__(self, node_name:str):
-        super().__init__(node_name)
-        self.state = State.PRIMARY_STATE_UNKNOWN
+_STATE_IDS = {label: state_id for state_id, label in _STATE_LABELS.items()}
 
-        self.available_transitions = [
-            TransitionDescription(
-                transition = self.create_transition(Transition.TRANSITION_CREATE, label="create"),
-                start_state = self.create_state(State.PRIMARY_STATE_UNKNOWN),
-                goal_state = self.create_state(State.PRIMARY_STATE_UNCONFIGURED)
-            ),
-            TransitionDescription(
-                transition = self.create_transition(Transition.TRANSITION_CONFIGURE, "configure"),
-                start_state = self.create_state(State.PRIMARY_STATE_UNCONFIGURED),
-                goal_state = self.create_state(State.PRIMARY_STATE_INACTIVE)
-            ),
-            TransitionDescription(
-                transition = self.create_transition(Transition.TRANSITION_ACTIVATE, "activate"),
-                start_state = self.create_state(State.PRIMARY_STATE_INACTIVE),
-                goal_state = self.create_state(State.PRIMARY_STATE_ACTIVE)
-            ),
-            TransitionDescription(
-                transition = self.create_transition(Transition.TRANSITION_DEACTIVATE, "deactivate"),
-                start_state = self.create_state(State.PRIMARY_STATE_ACTIVE),
-                goal_state = self.create_state(State.PRIMARY_STATE_INACTIVE)
-            ),
-            TransitionDescription(
-                transition = self.create_transition(Transition.TRANSITION_UNCONFIGURED_SHUTDOWN, "shutdown"),
-                start_state = self.create_state(State.PRIMARY_STATE_UNCONFIGURED),
-                goal_state = self.create_state(State.PRIMARY_STATE_FINALIZED)
-            ),
-            TransitionDescription(
-                transition = self.create_transition(Transition.TRANSITION_INACTIVE_SHUTDOWN, "shutdown"),
-                start_state = self.create_state(State.PRIMARY_STATE_INACTIVE),
-                goal_state = self.create_state(State.PRIMARY_STATE_FINALIZED)
-            ),
-            TransitionDescription(
-                transition = self.create_transition(Transition.TRANSITION_ACTIVE_SHUTDOWN, "shutdown"),
-                start_state = self.create_state(State.PRIMARY_STATE_ACTIVE),
-                goal_state = self.create_state(State.PRIMARY_STATE_FINALIZED)
-            ),
-            TransitionDescription(
-                transition = self.create_transition(Transition.TRANSITION_CLEANUP, "cleanup"),
-                start_state = self.create_state(State.PRIMARY_STATE_INACTIVE),
-                goal_state = self.create_state(State.PRIMARY_STATE_UNCONFIGURED)
-            )
-        ]
-        self.available_states = [
-            self.create_state(State.PRIMARY_STATE_UNKNOWN),
-            self.create_state(State.PRIMARY_STATE_UNCONFIGURED),
-            self.create_state(State.PRIMARY_STATE_INACTIVE),
-            self.create_state(State.PRIMARY_STATE_ACTIVE),
-            self.create_state(State.PRIMARY_STATE_FINALIZED),
-            self.create_state(State.TRANSITION_STATE_CONFIGURING),
-            self.create_state(State.TRANSITION_STATE_CLEANINGUP),
-            self.create_state(State.TRANSITION_STATE_SHUTTINGDOWN),
-            self.create_state(State.TRANSITION_STATE_ACTIVATING),
-            self.create_state(State.TRANSITION_STATE_DEACTIVATING),
-            self.create_state(State.TRANSITION_STATE_ERRORPROCESSING)
-        ]
 
+async def async_sleep(node, seconds, callback_group=None):
+    future = Future(executor=node.executor)
+
+    def wake_up():
+        node.destroy_timer(timer)
+        future.set_result(None)
+
+    timer = node.create_timer(seconds, wake_up, callback_group=callback_group)
+    await future
+
+
+async def wait_for_future(node, future, timeout, callback_group=None):
+    if future.done():
+        return True
+
+    deadline = Future(executor=node.executor)
+
+    def expire(_=None):
+        if not deadline.done():
+            deadline.set_result(None)
+
+    timer = node.create_timer(timeout, expire, callback_group=callback_group)
+    future.add_done_callback(expire)
+    try:
+        await deadline
+    finally:
+        node.destroy_timer(timer)
+    return future.done()
+
+
+def wrap_concurrent_future(node, concurrent_future):
+    # Hand the result of a concurrent.futures.Future back to the executor of
+    # node as an awaitable rclpy Future.
+    future = Future(executor=node.executor)
+
+    def done(_):
+        try:
+            future.set_result(concurrent_future.result())
+        except Exception as e:
+            future.set_exception(e)
+        if node.executor is not None:
+            node.executor.wake()
+
+    concurrent_future.add_done_callback(done)
+    return future
+
+
+_default_callback_pool = None
+_default_callback_pool_lock = threading.Lock()
+
+
+def default_callback_pool():
+    global _default_callback_pool
+    with _default_callback_pool_lock:
+        if _default_callback_pool is None:
+            _default_callback_pool = ThreadPoolExecutor(thread_name_prefix='lifecycle_callback')
+        return _default_callback_pool
+
+
+def offloaded(callback):
+    # Marks an on_* callback to run in the node's callback_pool instead of
+    # on the executor thread. The pool must be able to run the bound method,
+    # i.e. be a thread pool, process pools are used through run_in_pool().
+    callback.offload = True
+    return callback
+
+
+class RecoveryPolicy:
+    # After a successful error processing, bring the node back to the goal
+    # of the transition that failed, waiting initial_backoff * multiplier^n
+    # (capped at max_backoff) before attempt n, at most max_retries times
+    # in a row.
+
+    def __init__(self, max_retries=5, initial_backoff=1.0, max_backoff=60.0, multiplier=2.0):
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+
+    def backoff(self, attempt):
+        return min(self.initial_backoff * self.multiplier ** attempt, self.max_backoff)
+
+
+class LifecycleNode(Node, LifecycleStateMachine):
+    # ROS adapter of LifecycleStateMachine: lifecycle services and events,
+    # managed entities, timeouts, recovery, checkpoints and statistics.
+
+    @property
+    def available_states(self):
+        return _catalog().available_states
+
+    @property
+    def available_transitions(self):
+        return _catalog().available_transitions
+
+    def __init__(self, node_name: str, transition_timeout=None, transition_timeouts=None,
+                 registry=None, enable_communication_interface=True,
+                 transition_event_history=32, latch_transition_events=False,
+                 statistics_period=None, callback_pool=None, recovery_policy=None,
+                 checkpoint=None, recorder=None, bus=None, tracer=None,
+                 heartbeat_period=None, reconfigure_on_parameter_change=None, **kwargs):
+        # Publishers, subscriptions, timers, services, clients and managed
+        # entities created while configuring, entity -> destroy method. They
+        # are destroyed whenever the node gets back to UNCONFIGURED or
+        # FINALIZED, so cleanup/configure cycles do not accumulate them.
+        # Set up first, Node.__init__ already creates the parameter services.
+        self.configured_entities = {}
+        self.tracking_entities = False
+
+        # kwargs go to Node (namespace, context, enable_rosout, ...). Nodes
+        # served by a registry skip the parameter services unless asked for
+        # them; enable_rosout=False drops the rosout publisher as well, only
+        # the parameter_events publisher of rclpy is always there.
+        if registry is not None:
+            kwargs.setdefault('start_parameter_services', False)
+
+        super().__init__(node_name, **kwargs)
+        LifecycleStateMachine.__init__(
+            self, transition_timeout, transition_timeouts, bus,
+            lambda: self.get_clock().now().nanoseconds,
+            tracer, self.get_fully_qualified_name())
+
+        # Ring buffer of (sequence number, timestamp, TransitionEvent). With
+        # latch_transition_events the transition_event publisher is transient
+        # local with the same depth, so late subscribers get the history.
+        self.transition_history = deque(maxlen=max(transition_event_history, 1))
+
+        # One preallocated TransitionEvent per (transition, start, goal), only
+        # the timestamp changes between publications. Its sub-messages come
+        # from _catalog() and are shared, none of it may be modified.
+        self.transition_event_messages = {}
+        self.transition_sequence = 0
+        self.latch_transition_events = latch_transition_events
+
+        self.recovery_policy = recovery_policy
+        self.recovery_attempts = 0
+        self.recovering = False
+
+        # Parameters changed while configured, name -> new value, handed to
+        # on_reconfigure() once the new values are set. Only done for nodes
+        # implementing on_reconfigure() unless asked for explicitly, True on
+        # a node without it reconfigures through a full cycle. Transitions
+        # are rejected while on_reconfigure() runs.
+        self.pending_parameters = {}
+        self.reconfigure_timer = None
+        self.reconfiguring = False
+        if reconfigure_on_parameter_change is None:
+            reconfigure_on_parameter_change = (
+                type(self).on_reconfigure is not LifecycleNode.on_reconfigure)
+        if reconfigure_on_parameter_change:
+            self.add_on_set_parameters_callback(self.parameters_callback)
+
+        # Path or Checkpoint recording the last stable primary state and the
+        # on_checkpoint() snapshot, restored through on_restore() on startup.
+        if isinstance(checkpoint, str):
+            checkpoint = Checkpoint(checkpoint)
+        self.checkpoint = checkpoint
+
+        # TransitionRecorder (possibly shared with other nodes) logging every
+        # transition event of this node with its callback duration.
+        self.recorder = recorder
+        self.recorder_id = None
+        if recorder is not None:
+            self.recorder_id = recorder.register_node(self.get_fully_qualified_name())
+
+        # concurrent.futures executor for @offloaded callbacks and
+        # run_in_pool(), shared by all nodes in the process by default. The
+        # callbacks are bound methods of the node, which cannot be pickled
+        # for a process pool.
+        if callback_pool is not None and not isinstance(callback_pool, ThreadPoolExecutor):
+            raise TypeError(
+                'callback_pool must be a ThreadPoolExecutor, pass process pools to '
+                'run_in_pool(pool=...) instead')
+        self.callback_pool = callback_pool
+
+        # The lifecycle services are reentrant so get_state and friends are
+        # still served while a change_state coroutine awaits its callback.
+        self.lifecycle_callback_group = ReentrantCallbackGroup()
+
+        # Publishers/timers/subscriptions switched on and off with the active
+        # state.
+        self.managed_entities = []
+
+        # Timing of every transition keyed by its name ('configure', ...),
+        # published every statistics_period seconds when set.
+        self.transition_statistics = {}
+        self.pub_transition_statistics = None
+        if statistics_period is not None:
+            self.pub_transition_statistics = self.create_publisher(
+                DiagnosticArray, node_name + '/transition_statistics', 1)
+            self.statistics_timer = self.create_timer(
+                statistics_period, self.publish_transition_statistics,
+                callback_group=self.lifecycle_callback_group)
+
+        # Beat on the shared heartbeat topic every heartbeat_period seconds
+        # while active, watched by lifecycle_heartbeat.HeartbeatMonitor.
+        self.heartbeat = None
+        if heartbeat_period is not None:
+            self.heartbeat = Heartbeat(self, heartbeat_period)
+            self.managed_entities.append(self.heartbeat)
+
+        # With a shared LifecycleRegistry the per-node services and event
+        # publisher can be left out to keep the number of entities down.
+        self.registry = registry
+        self.srv_get_state = None
+        self.srv_change_state = None
+        self.srv_change_state_to = None
+        self.srv_get_available_states = None
+        self.srv_get_available_transitions = None
+        self.srv_transition_history = None
+        self.pub_transition_event = None
+
+        if enable_communication_interface:
+            self.create_communication_interface(node_name)
+
+        if registry is not None:
+            registry.register(self)
+
+        self.create()
+
+        if self.checkpoint is not None:
+            restore_state, snapshot = self.checkpoint.load()
+            if restore_state in (State.PRIMARY_STATE_INACTIVE, State.PRIMARY_STATE_ACTIVE):
+                async def restore():
+                    self.destroy_timer(restore_timer)
+                    await self.restore_checkpoint(restore_state, snapshot)
+
+                restore_timer = self.create_timer(
+                    0.0, restore, callback_group=self.lifecycle_callback_group)
+
+    def create_communication_interface(self, node_name):
         self.srv_get_state = self.create_service(
-                GetState, 
+                GetState,
                 node_name + '/get_state',
-                self.get_state
+                self.get_state,
+                callback_group=self.lifecycle_callback_group
             )
 
         self.srv_change_state = self.create_service(
                 ChangeState,
                 node_name + '/change_state',
-                self.change_state
+                self.change_state,
+                callback_group=self.lifecycle_callback_group
+            )
+
+        self.srv_change_state_to = self.create_service(
+                ChangeState,
+                node_name + '/change_state_to',
+                self.change_state_to,
+                callback_group=self.lifecycle_callback_group
             )
 
         self.srv_get_available_states = self.create_service(
-                GetAvailableStates, 
+                GetAvailableStates,
                 node_name + '/get_available_states',
-                self.get_available_states
+                self.get_available_states,
+                callback_group=self.lifecycle_callback_group
             )
 
         self.srv_get_available_transitions = self.create_service(
                 GetAvailableTransitions,
                 node_name + '/get_available_transitions',
-                self.get_available_transitions
+                self.get_available_transitions,
+                callback_group=self.lifecycle_callback_group
+            )
+
+        self.srv_transition_history = self.create_service(
+                Trigger,
+                node_name + '/transition_history',
+                self.transition_history_callback,
+                callback_group=self.lifecycle_callback_group
             )
 
+        if self.latch_transition_events:
+            transition_event_qos = QoSProfile(
+                depth=self.transition_history.maxlen,
+                durability=DurabilityPolicy.TRANSIENT_LOCAL)
+        else:
+            transition_event_qos = 1
+
         self.pub_transition_event = self.create_publisher(
-                TransitionEvent, 
+                TransitionEvent,
                 node_name + '/transition_event',
-                1
+                transition_event_qos
             )
-        
-        self.create()
-
 
     def get_label(self, msg_type, id):
-        for key, value in vars(msg_type).items():
-            if(value == id):
-                return key
-        return None
-
+        return _LABELS[msg_type].get(id)
 
     def create_state(self, state):
-        return State(id=state, label=self.get_label(State, state))
+        return State(id=state, label=_STATE_LABELS.get(state))
 
     def create_transition(self, transition, label=None):
         if not label:
-            self.get_label(Transition, transition)
-        return Transition(id = transition, label = label)
+            label = _TRANSITION_LABELS.get(transition)
+        return Transition(id=transition, label=label)
 
     def get_state(self, request, response):
-        response.current_state = State(id=self.state, label=self.get_label(State, self.state))
-        return response 
-
-
-    def change_state(self, request, response):
-        
-        if(request.transition.id == Transition.TRANSITION_CREATE):
-            response.success = (self.create() == Transition.TRANSITION_CALLBACK_SUCCESS)
-
-        elif(request.transition.id == Transition.TRANSITION_CONFIGURE):
-            response.success = (self.configure() == Transition.TRANSITION_CALLBACK_SUCCESS)
-
-        elif(request.transition.id == Transition.TRANSITION_CLEANUP):
-            response.success = (self.cleanup() == Transition.TRANSITION_CALLBACK_SUCCESS)
-
-        elif(request.transition.id == Transition.TRANSITION_ACTIVATE):
-            response.success = (self.activate() == Transition.TRANSITION_CALLBACK_SUCCESS)
-
-        elif(request.transition.id == Transition.TRANSITION_DEACTIVATE):
-            response.success = (self.deactivate() == Transition.TRANSITION_CALLBACK_SUCCESS)
-
-        elif(request.transition.id == Transition.TRANSITION_UNCONFIGURED_SHUTDOWN
-              or request.transition.id == Transition.TRANSITION_INACTIVE_SHUTDOWN
-              or request.transition.id == Transition.TRANSITION_ACTIVE_SHUTDOWN):
-            response.success = (self.shutdown() == Transition.TRANSITION_CALLBACK_SUCCESS)
-
-        elif(request.transition==Transition.TRANSITION_DESTROY):
-            response.success = self.destroy()
-
-        else:
-            response.success = False
+        response.current_state = _catalog().states[self.state]
+        return response
 
+    async def change_state(self, request, response):
+        result = await self.apply_transition(request.transition.id)
+        response.success = (result == Transition.TRANSITION_CALLBACK_SUCCESS)
         return response
 
+    async def change_state_to(self, request, response):
+        # The goal state is given by its label in transition.label, or by its
+        # id in transition.id when the label is empty.
+        goal_state = request.transition.id
+        if request.transition.label:
+            goal_state = _STATE_IDS.get(request.transition.label)
+        response.success = goal_state is not None and await self.go_to_state(goal_state)
+        return response
 
     def get_available_states(self, request, response):
         response.available_states = self.available_states
         return response
 
-
     def get_available_transitions(self, request, response):
         response.available_transitions = self.available_transitions
         return response
 
+    def transition_history_callback(self, request, response):
+        # The history as a JSON list of {"sequence", "timestamp",
+        # "transition", "start_state", "goal_state"} in message, so a
+        # reconnecting subscriber can resync from the last sequence it saw.
+        response.success = True
+        response.message = json.dumps([
+            {'sequence': sequence, 'timestamp': timestamp,
+             'transition': event.transition.id,
+             'start_state': event.start_state.id,
+             'goal_state': event.goal_state.id}
+            for sequence, timestamp, event in self.transition_history
+        ])
+        return response
 
-    def create(self):
-        if(self.state == State.PRIMARY_STATE_UNKNOWN):
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = Transition.TRANSITION_CREATE,
-                        label = self.get_label(Transition, Transition.TRANSITION_CREATE)),
-                    start_state = State(
-                        id = State.PRIMARY_STATE_UNKNOWN,
-                        label = self.get_label(State, State.PRIMARY_STATE_UNKNOWN)),
-                    goal_state = State(
-                        id = State.PRIMARY_STATE_UNCONFIGURED,
-                        label = self.get_label(State, State.PRIMARY_STATE_UNCONFIGURED))
-                )
-            )
-
-            self.state = State.PRIMARY_STATE_UNCONFIGURED
-            return Transition.TRANSITION_CALLBACK_SUCCESS 
-        else:
-            return Transition.TRANSITION_CALLBACK_FAILURE
-
-
-    def configure(self):
-        if(self.state == State.PRIMARY_STATE_UNCONFIGURED):
-
-            self.state = State.TRANSITION_STATE_CONFIGURING
-
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = Transition.TRANSITION_CONFIGURE,
-                        label = self.get_label(Transition, Transition.TRANSITION_CONFIGURE)),
-                    start_state = State(
-                        id = State.PRIMARY_STATE_UNCONFIGURED,
-                        label = self.get_label(State, State.PRIMARY_STATE_UNCONFIGURED)),
-                    goal_state = State(
-                        id = self.state,
-                        label = self.get_label(State, self.state))
-                )
-            )
-
-            task_config = self.executor.create_task(self.on_configure)
-
-            self.executor.spin_until_future_complete(task_config)
-
-            result_transition = None
-            if(task_config.result() == Transition.TRANSITION_CALLBACK_SUCCESS):
-                self.state = State.PRIMARY_STATE_INACTIVE
-                result_transition = Transition.TRANSITION_ON_CONFIGURE_SUCCESS
-
-            elif(task_config.result() == Transition.TRANSITION_CALLBACK_FAILURE):
-                self.state = State.PRIMARY_STATE_UNCONFIGURED
-                result_transition = Transition.TRANSITION_ON_CONFIGURE_FAILURE
-
-            else:
-                self.state = State.TRANSITION_STATE_ERRORPROCESSING
-                result_transition = Transition.TRANSITION_ON_CONFIGURE_ERROR
-
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = result_transition,
-                        label = self.get_label(Transition, result_transition)),
-                    start_state = State(
-                        id = State.PRIMARY_STATE_UNCONFIGURED,
-                        label = self.get_label(State, State.PRIMARY_STATE_UNCONFIGURED)),
-                    goal_state = State(
-                        id = self.state,
-                        label = self.get_label(State, self.state))
-                )
-            )       
-
-            return task_config.result()
-
-        else:
-            return Transition.TRANSITION_CALLBACK_FAILURE
-
-
-    def cleanup(self):
-        if(self.state == State.PRIMARY_STATE_INACTIVE):
-
-            self.state = State.TRANSITION_STATE_CLEANINGUP
-
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = Transition.TRANSITION_CLEANUP,
-                        label = self.get_label(Transition, Transition.TRANSITION_CLEANUP)),
-                    start_state = State(
-                        id = State.PRIMARY_STATE_INACTIVE,
-                        label = self.get_label(State, State.PRIMARY_STATE_INACTIVE)),
-                    goal_state = State(
-                        id = self.state,
-                        label = self.get_label(State, self.state))
-                )
-            )       
-
-            task_cleanup = self.executor.create_task(self.on_cleanup)
-
-            self.executor.spin_until_future_complete(task_cleanup)
-
-            result_transition = None
-            if(task_cleanup.result() == Transition.TRANSITION_CALLBACK_SUCCESS):
-                self.state = State.PRIMARY_STATE_UNCONFIGURED
-                result_transition = Transition.TRANSITION_ON_CLEANUP_SUCCESS
-
-            else:
-                self.state = State.TRANSITION_STATE_ERRORPROCESSING
-                result_transition = Transition.TRANSITION_ON_CLEANUP_ERROR
-            
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = result_transition,
-                        label = self.get_label(Transition, result_transition)),
-                    start_state = State(
-                        id = State.TRANSITION_STATE_CLEANINGUP,
-                        label = self.get_label(State, State.TRANSITION_STATE_CLEANINGUP)),
-                    goal_state = State(
-                        id = self.state,
-                        label = self.get_label(State, self.state))
-                )
-            )       
-
-            return task_cleanup.result()
-
-        else:
-            return Transition.TRANSITION_CALLBACK_FAILURE
-
-
-    def activate(self):
-        if(self.state == State.PRIMARY_STATE_INACTIVE):
-
-            self.state = State.TRANSITION_STATE_ACTIVATING
-
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = Transition.TRANSITION_ACTIVATE,
-                        label = self.get_label(Transition, Transition.TRANSITION_ACTIVATE)),
-                    start_state = State(
-                        id = State.PRIMARY_STATE_INACTIVE,
-                        label = self.get_label(State, State.PRIMARY_STATE_INACTIVE)),
-                    goal_state = State(
-                        id = self.state,
-                        label = self.get_label(State, self.state))
-                )
-            )       
-
-            task_activate = self.executor.create_task(self.on_activate)
-
-            self.executor.spin_until_future_complete(task_activate)
-
-            result_transition = None
-            if(task_activate.result() == Transition.TRANSITION_CALLBACK_SUCCESS):
-                self.state = State.PRIMARY_STATE_ACTIVE
-                result_transition = Transition.TRANSITION_ON_ACTIVATE_SUCCESS
-
-            elif(task_activate.result() == Transition.TRANSITION_CALLBACK_FAILURE):
-                self.state = State.PRIMARY_STATE_INACTIVE
-                result_transition = Transition.TRANSITION_ON_ACTIVATE_FAILURE
-
-            else:
-                self.state = State.TRANSITION_STATE_ERRORPROCESSING
-                result_transition = Transition.TRANSITION_ON_CONFIGURE_ERROR
-            
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = result_transition,
-                        label = self.get_label(Transition, result_transition)),
-                    start_state = State(
-                        id = State.TRANSITION_STATE_ACTIVATING,
-                        label = self.get_label(State, State.TRANSITION_STATE_ACTIVATING)),
-                    goal_state = State(
-                        id = self.state,
-                        label = self.get_label(State, self.state))
-                )
-            )       
-
-            return task_activate.result()
-
-        else:
-            return Transition.TRANSITION_CALLBACK_FAILURE
-
-
-    def deactivate(self):
-        if(self.state == State.PRIMARY_STATE_ACTIVE):
-
-            self.state = State.TRANSITION_STATE_DEACTIVATING
-
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = Transition.TRANSITION_DEACTIVATE,
-                        label = self.get_label(Transition, Transition.TRANSITION_DEACTIVATE)),
-                    start_state = State(
-                        id = State.PRIMARY_STATE_ACTIVE,
-                        label = self.get_label(State, State.PRIMARY_STATE_ACTIVE)),
-                    goal_state = State(
-                        id = self.state,
-                        label = self.get_label(State, self.state))
-                )
-            )       
-
-            task_deactivate = self.executor.create_task(self.on_deactivate)
-
-            self.executor.spin_until_future_complete(task_deactivate)
-
-            result_transition = None
-            if(task_deactivate.result() == Transition.TRANSITION_CALLBACK_SUCCESS):
-                self.state = State.PRIMARY_STATE_INACTIVE
-                result_transition = Transition.TRANSITION_ON_DEACTIVATE_SUCCESS
-
-            else:
-                self.state = State.TRANSITION_STATE_ERRORPROCESSING
-                result_transition = Transition.TRANSITION_ON_DEACTIVATE_ERROR
-            
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = result_transition,
-                        label = self.get_label(Transition, result_transition)),
-                    start_state = State(
-                        id = State.TRANSITION_STATE_DEACTIVATING,
-                        label = self.get_label(State, State.TRANSITION_STATE_DEACTIVATING)),
-                    goal_state = State(
-                        id = self.state,
-                        label = self.get_label(State, self.state))
-                )
-            )       
-
-            return task_deactivate.result()
-
-        else:
-            return Transition.TRANSITION_CALLBACK_FAILURE
-
-
-    def shutdown(self):
-        if (self.state == State.PRIMARY_STATE_UNCONFIGURED):
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = Transition.TRANSITION_UNCONFIGURED_SHUTDOWN,
-                        label = self.get_label(Transition, Transition.TRANSITION_UNCONFIGURED_SHUTDOWN)),
-                    start_state = State(
-                        id = State.PRIMARY_STATE_UNCONFIGURED,
-                        label = self.get_label(State, State.PRIMARY_STATE_UNCONFIGURED)),
-                    goal_state = State(
-                        id = State.TRANSITION_STATE_SHUTTINGDOWN,
-                        label = self.get_label(State, State.TRANSITION_STATE_SHUTTINGDOWN))
-                )
-            )       
-
-        elif (self.state == State.PRIMARY_STATE_INACTIVE):
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = Transition.TRANSITION_INACTIVE_SHUTDOWN,
-                        label = self.get_label(Transition, Transition.TRANSITION_INACTIVE_SHUTDOWN)),
-                    start_state = State(
-                        id = State.PRIMARY_STATE_INACTIVE,
-                        label = self.get_label(State, State.PRIMARY_STATE_INACTIVE)),
-                    goal_state = State(
-                        id = State.TRANSITION_STATE_SHUTTINGDOWN,
-                        label = self.get_label(State, State.TRANSITION_STATE_SHUTTINGDOWN))
-                )
-            )       
-
-        elif (self.state == State.PRIMARY_STATE_ACTIVE):
-            self.pub_transition_event.publish(
-                TransitionEvent(
-                    timestamp = self.get_clock().now().nanoseconds,
-                    transition = Transition(
-                        id = Transition.TRANSITION_ACTIVE_SHUTDOWN,
-                        label = self.get_label(Transition, Transition.TRANSITION_ACTIVE_SHUTDOWN)),
-                    start_state = State(
-                        id = State.PRIMARY_STATE_ACTIVE,
-                        label = self.get_label(State, State.PRIMARY_STATE_ACTIVE)),
-                    goal_state = State(
-                        id = State.TRANSITION_STATE_SHUTTINGDOWN,
-                        label = self.get_label(State, State.TRANSITION_STATE_SHUTTINGDOWN))
-                )
-            )       
-
-        else:
-            return Transition.TRANSITION_CALLBACK_FAILURE
-
-        self.state = State.TRANSITION_STATE_SHUTTINGDOWN
-
-        task_shutdown = self.executor.create_task(self.on_shutdown)
-
-        self.executor.spin_until_future_complete(task_shutdown)
-
-        result_transition = None
-        if(task_shutdown.result() == Transition.TRANSITION_CALLBACK_SUCCESS):
-            self.state = State.PRIMARY_STATE_FINALIZED
-            result_transition = Transition.TRANSITION_ON_SHUTDOWN_SUCCESS
-
-        else:
-            self.state = State.TRANSITION_STATE_ERRORPROCESSING
-            result_transition = Transition.TRANSITION_ON_SHUTDOWN_ERROR
-        
-        self.pub_transition_event.publish(
-            TransitionEvent(
-                timestamp = self.get_clock().now().nanoseconds,
-                transition = Transition(
-                    id = result_transition,
-                    label = self.get_label(Transition, result_transition)),
-                start_state = State(
-                    id = State.TRANSITION_STATE_SHUTTINGDOWN,
-                    label = self.get_label(State, State.TRANSITION_STATE_SHUTTINGDOWN)),
-                goal_state = State(
-                    id = self.state,
-                    label = self.get_label(State, self.state))
-            )
-        )       
-
-        return task_shutdown.result()
+    def create_future(self):
+        return Future(executor=self.executor)
+
+    def publish_transition_event(self, transition, start_state, goal_state,
+                                 callback_duration=0.0, timestamp=None):
+        # Managed entities are off for the whole time outside of ACTIVE,
+        # including the transitions out of and into it.
+        if start_state == State.PRIMARY_STATE_ACTIVE:
+            self.set_managed_entities_active(False)
+
+        self.tracking_entities = goal_state == State.TRANSITION_STATE_CONFIGURING
+        if goal_state in (State.PRIMARY_STATE_UNCONFIGURED, State.PRIMARY_STATE_FINALIZED):
+            self.destroy_configured_entities()
+
+        key = (transition, start_state, goal_state)
+        event = self.transition_event_messages.get(key)
+        if event is None:
+            event = self.transition_event_messages[key] = TransitionEvent(
+                transition=_catalog().transitions[transition],
+                start_state=_catalog().states[start_state],
+                goal_state=_catalog().states[goal_state])
+        event.timestamp = self.clock() if timestamp is None else timestamp
+
+        self.transition_sequence += 1
+        self.transition_history.append((self.transition_sequence, event.timestamp, event))
+
+        if self.pub_transition_event is not None:
+            self.pub_transition_event.publish(event)
+
+        if self.registry is not None:
+            self.registry.notify_transition(self, event)
+
+        if self.recorder is not None:
+            self.recorder.record(
+                event.timestamp, self.recorder_id, transition, start_state, goal_state,
+                int(callback_duration * 1e9))
+
+        super().publish_transition_event(
+            transition, start_state, goal_state, callback_duration, event.timestamp)
+
+        if goal_state == State.PRIMARY_STATE_ACTIVE:
+            self.set_managed_entities_active(True)
+
+    def record_transition_statistics(self, name, result, duration, callback_duration, queued):
+        statistics = self.transition_statistics.get(name)
+        if statistics is None:
+            statistics = self.transition_statistics[name] = TransitionStatistics()
+        statistics.record(result, duration, callback_duration, queued)
+
+    def get_transition_statistics(self):
+        return {name: stats.as_dict() for name, stats in self.transition_statistics.items()}
+
+    def publish_transition_statistics(self):
+        msg = DiagnosticArray(status=[
+            stats.to_status('%s: %s' % (self.get_fully_qualified_name(), name))
+            for name, stats in self.transition_statistics.items()
+        ])
+        msg.header.stamp = self.get_clock().now().to_msg()
+        self.pub_transition_statistics.publish(msg)
+
+    def get_transition_history(self, since_sequence=None, since_timestamp=None):
+        # The history holds the reused messages, hand out copies with the
+        # timestamp of each publication.
+        return [
+            (sequence, TransitionEvent(
+                timestamp=timestamp,
+                transition=event.transition,
+                start_state=event.start_state,
+                goal_state=event.goal_state))
+            for sequence, timestamp, event in self.transition_history
+            if (since_sequence is None or sequence > since_sequence)
+            and (since_timestamp is None or timestamp > since_timestamp)
+        ]
 
+    def enter_transition(self, transition_id):
+        with self.transition_lock:
+            if self.reconfiguring:
+                return None
+            return super().enter_transition(transition_id)
+
+    async def trigger_transition(self, transition_id, requested_at=None):
+        result = await super().trigger_transition(transition_id, requested_at)
+
+        # Brought back by hand after recovery gave up (or between attempts),
+        # the next error starts a fresh series. Recovery itself only resets
+        # at its goal, a node failing activation over and over would retry
+        # forever otherwise.
+        if (result == Transition.TRANSITION_CALLBACK_SUCCESS and not self.recovering
+                and self.state in (State.PRIMARY_STATE_INACTIVE, State.PRIMARY_STATE_ACTIVE)):
+            self.recovery_attempts = 0
+
+        if self.checkpoint is not None:
+            self.record_checkpoint(
+                transition_id == Transition.TRANSITION_CONFIGURE
+                and self.state == State.PRIMARY_STATE_INACTIVE)
+
+        return result
+
+    def record_checkpoint(self, with_snapshot=False):
+        if self.state == State.PRIMARY_STATE_FINALIZED:
+            self.checkpoint.clear()
+        elif with_snapshot:
+            snapshot = self.on_checkpoint()
+            self.checkpoint.save(self.state, b'' if snapshot is None else snapshot)
+        elif self.state in (State.PRIMARY_STATE_UNCONFIGURED,
+                            State.PRIMARY_STATE_INACTIVE,
+                            State.PRIMARY_STATE_ACTIVE):
+            self.checkpoint.save_state(self.state)
+
+    async def restore_checkpoint(self, restore_state, snapshot):
+        # Configure through on_restore(snapshot) instead of on_configure, then
+        # activate again if that is where the node was. A declined restore
+        # falls back to a regular configure.
+        started_at = time.monotonic()
+        entered = self.enter_transition(Transition.TRANSITION_CONFIGURE)
+        if entered is None:
+            return
+
+        _, start_state, spec = entered
+        self.publish_transition_event(Transition.TRANSITION_CONFIGURE, start_state, self.state)
+
+        def restore():
+            return self.on_restore(snapshot)
+
+        result = await self.execute_transition(
+            spec,
+            self.transition_timeouts.get(Transition.TRANSITION_CONFIGURE, self.transition_timeout),
+            started_at,
+            None,
+            callback=restore,
+            name='restore')
+
+        if self.state == State.TRANSITION_STATE_ERRORPROCESSING:
+            await self.process_error(spec)
+
+        if result == Transition.TRANSITION_CALLBACK_SUCCESS:
+            self.get_logger().info('restored from checkpoint %s' % self.checkpoint.path)
+            self.checkpoint.save_state(self.state)
+        elif self.state == State.PRIMARY_STATE_UNCONFIGURED:
+            await self.trigger_transition(Transition.TRANSITION_CONFIGURE)
+
+        if (restore_state == State.PRIMARY_STATE_ACTIVE
+                and self.state == State.PRIMARY_STATE_INACTIVE):
+            await self.trigger_transition(Transition.TRANSITION_ACTIVATE)
+
+    async def process_error(self, failed_spec):
+        await super().process_error(failed_spec)
+
+        goal_state = failed_spec.outcomes[Transition.TRANSITION_CALLBACK_SUCCESS][1]
+        if (self.recovery_policy is not None and not self.recovering
+                and self.state == State.PRIMARY_STATE_UNCONFIGURED
+                and goal_state in (State.PRIMARY_STATE_INACTIVE, State.PRIMARY_STATE_ACTIVE)):
+            self.schedule_recovery(goal_state)
+
+    def schedule_recovery(self, goal_state):
+        if self.recovery_attempts >= self.recovery_policy.max_retries:
+            self.get_logger().error(
+                'giving up recovery after %d attempts' % self.recovery_attempts)
+            return
+
+        delay = self.recovery_policy.backoff(self.recovery_attempts)
+        self.recovery_attempts += 1
+        self.get_logger().warn('recovery attempt %d in %.3f s' % (self.recovery_attempts, delay))
+
+        async def recover():
+            self.destroy_timer(timer)
+            await self.recover(goal_state)
+
+        timer = self.create_timer(delay, recover, callback_group=self.lifecycle_callback_group)
+
+    async def recover(self, goal_state):
+        if self.state not in (State.PRIMARY_STATE_UNCONFIGURED, State.PRIMARY_STATE_INACTIVE):
+            # Moved on by someone else while the backoff was running.
+            return
+
+        self.recovering = True
+        try:
+            if self.state == State.PRIMARY_STATE_UNCONFIGURED:
+                await self.trigger_transition(Transition.TRANSITION_CONFIGURE)
+            if (self.state == State.PRIMARY_STATE_INACTIVE
+                    and goal_state == State.PRIMARY_STATE_ACTIVE):
+                await self.trigger_transition(Transition.TRANSITION_ACTIVATE)
+        finally:
+            self.recovering = False
+
+        if self.state == goal_state:
+            self.get_logger().info(
+                'recovered after %d attempts' % self.recovery_attempts)
+            self.recovery_attempts = 0
+        elif self.state in (State.PRIMARY_STATE_UNCONFIGURED, State.PRIMARY_STATE_INACTIVE):
+            self.schedule_recovery(goal_state)
+
+    def parameters_callback(self, parameters):
+        # Called before the values are set, so only diff and defer. Changes
+        # while unconfigured or in a transition are left to on_configure.
+        # Declaring a parameter is not a change, use_sim_time is handled by
+        # rclpy itself.
+        if self.state in (State.PRIMARY_STATE_INACTIVE, State.PRIMARY_STATE_ACTIVE):
+            for parameter in parameters:
+                if (parameter.name != 'use_sim_time'
+                        and self.has_parameter(parameter.name)
+                        and self.get_parameter(parameter.name).value != parameter.value):
+                    self.pending_parameters[parameter.name] = parameter.value
+
+            if self.pending_parameters and self.reconfigure_timer is None:
+                self.reconfigure_timer = self.create_timer(
+                    0.0, self.apply_pending_parameters,
+                    callback_group=self.lifecycle_callback_group)
+
+        return SetParametersResult(successful=True)
+
+    async def apply_pending_parameters(self):
+        self.destroy_timer(self.reconfigure_timer)
+        self.reconfigure_timer = None
+        changed, self.pending_parameters = self.pending_parameters, {}
+        await self.reconfigure(changed)
+
+    async def reconfigure(self, changed):
+        # Update the node in place through on_reconfigure(changed), falling
+        # back to deactivate -> cleanup -> configure -> activate back to the
+        # current state when it declines.
+        with self.transition_lock:
+            goal_state = self.state
+            if (self.reconfiguring or goal_state not in (
+                    State.PRIMARY_STATE_INACTIVE, State.PRIMARY_STATE_ACTIVE)):
+                return Transition.TRANSITION_CALLBACK_FAILURE
+            self.reconfiguring = True
+
+        try:
+            result = await self.run_transition_callback(
+                self.on_reconfigure, self.transition_timeout, (changed,))
+        finally:
+            self.reconfiguring = False
+        if result == Transition.TRANSITION_CALLBACK_SUCCESS:
+            if self.checkpoint is not None:
+                self.record_checkpoint(with_snapshot=True)
+            return result
+
+        self.get_logger().info(
+            'reconfiguring %s with a full cycle' % ', '.join(sorted(changed)))
+        if self.state == State.PRIMARY_STATE_ACTIVE:
+            await self.trigger_transition(Transition.TRANSITION_DEACTIVATE)
+        if self.state == State.PRIMARY_STATE_INACTIVE:
+            await self.trigger_transition(Transition.TRANSITION_CLEANUP)
+        if self.state == State.PRIMARY_STATE_UNCONFIGURED:
+            await self.trigger_transition(Transition.TRANSITION_CONFIGURE)
+        if (goal_state == State.PRIMARY_STATE_ACTIVE
+                and self.state == State.PRIMARY_STATE_INACTIVE):
+            await self.trigger_transition(Transition.TRANSITION_ACTIVATE)
+
+        if self.state == goal_state:
+            return Transition.TRANSITION_CALLBACK_SUCCESS
+        return Transition.TRANSITION_CALLBACK_FAILURE
+
+    async def run_transition_callback(self, callback, timeout=None, args=()):
+        name = callback.__name__
+        if getattr(callback, 'offload', False):
+            pool_callback = callback
+            if self.tracer is not None:
+                pool_callback = self.tracer.wrap(self.trace_track, name + ' (pool)', callback)
+
+            async def callback(*args):
+                return await self.run_in_pool(pool_callback, *args)
+
+        try:
+            if timeout is None:
+                result = callback(*args)
+                if inspect.isawaitable(result):
+                    result = await result
+                return result
+
+            task = self.executor.create_task(callback, *args)
+            if not await self.wait_for(task, timeout):
+                task.cancel()
+                self.get_logger().error('%s() did not finish within %.3f s' % (name, timeout))
+                return Transition.TRANSITION_CALLBACK_ERROR
+            return task.result()
+        except Exception as e:
+            self.get_logger().error('%s() raised %r' % (name, e))
+            return Transition.TRANSITION_CALLBACK_ERROR
+
+    async def run_in_pool(self, fn, *args, pool=None):
+        pool = pool or self.callback_pool or default_callback_pool()
+        return await wrap_concurrent_future(self, pool.submit(fn, *args))
+
+    async def wait_for(self, future, timeout):
+        return await wait_for_future(self, future, timeout, self.lifecycle_callback_group)
 
     def destroy(self):
-        if(self.state == State.PRIMARY_STATE_FINALIZED):
+        result = super().destroy()
+        if result == Transition.TRANSITION_CALLBACK_SUCCESS:
+            if self.registry is not None:
+                self.registry.unregister(self)
             self.destroy_node()
+        return result
+
+    def track_entity(self, entity, destroy):
+        if self.tracking_entities:
+            self.configured_entities[entity] = destroy
+        return entity
+
+    def destroy_configured_entities(self):
+        entities = list(self.configured_entities.items())
+        self.configured_entities.clear()
+        for entity, destroy in reversed(entities):
+            destroy(entity)
+
+    def get_entity_count(self):
+        return {
+            'publishers': len(list(self.publishers)),
+            'subscriptions': len(list(self.subscriptions)),
+            'timers': len(list(self.timers)),
+            'services': len(list(self.services)),
+            'clients': len(list(self.clients)),
+            'managed': len(self.managed_entities),
+            'configured': len(self.configured_entities),
+        }
+
+    def create_publisher(self, *args, **kwargs):
+        return self.track_entity(
+            super().create_publisher(*args, **kwargs), self.destroy_publisher)
+
+    def create_subscription(self, *args, **kwargs):
+        return self.track_entity(
+            super().create_subscription(*args, **kwargs), self.destroy_subscription)
+
+    def create_timer(self, *args, **kwargs):
+        return self.track_entity(super().create_timer(*args, **kwargs), self.destroy_timer)
+
+    def create_service(self, *args, **kwargs):
+        return self.track_entity(super().create_service(*args, **kwargs), self.destroy_service)
+
+    def create_client(self, *args, **kwargs):
+        return self.track_entity(super().create_client(*args, **kwargs), self.destroy_client)
+
+    # Entities destroyed by hand, e.g. the timers of sleep(), are no longer
+    # tracked.
+
+    def destroy_publisher(self, publisher):
+        self.configured_entities.pop(publisher, None)
+        return super().destroy_publisher(publisher)
+
+    def destroy_subscription(self, subscription):
+        self.configured_entities.pop(subscription, None)
+        return super().destroy_subscription(subscription)
+
+    def destroy_timer(self, timer):
+        self.configured_entities.pop(timer, None)
+        return super().destroy_timer(timer)
+
+    def destroy_service(self, service):
+        self.configured_entities.pop(service, None)
+        return super().destroy_service(service)
+
+    def destroy_client(self, client):
+        self.configured_entities.pop(client, None)
+        return super().destroy_client(client)
+
+    def destroy_managed_entity(self, entity):
+        self.configured_entities.pop(entity, None)
+        if entity in self.managed_entities:
+            self.managed_entities.remove(entity)
+        entity.destroy()
+
+    def create_lifecycle_publisher(self, *args, **kwargs):
+        publisher = LifecyclePublisher(
+            self.create_publisher(*args, **kwargs),
+            self.state == State.PRIMARY_STATE_ACTIVE)
+        self.managed_entities.append(publisher)
+        return self.track_entity(publisher, self.destroy_managed_entity)
+
+    def create_lifecycle_timer(self, *args, **kwargs):
+        timer = LifecycleTimer(
+            self.create_timer(*args, **kwargs),
+            self.state == State.PRIMARY_STATE_ACTIVE)
+        self.managed_entities.append(timer)
+        return self.track_entity(timer, self.destroy_managed_entity)
+
+    def create_lifecycle_subscription(self, msg_type, topic, callback, qos_profile,
+                                      raw=False, latest_only=False, **kwargs):
+        subscription = LifecycleSubscription(
+            self, msg_type, topic, callback, qos_profile, raw, latest_only,
+            self.state == State.PRIMARY_STATE_ACTIVE, **kwargs)
+        self.managed_entities.append(subscription)
+        return self.track_entity(subscription, self.destroy_managed_entity)
+
+    def set_managed_entities_active(self, active):
+        for entity in self.managed_entities:
+            if active:
+                entity.on_activate()
+            else:
+                entity.on_deactivate()
 
-        else:
-            return Transition.TRANSITION_CALLBACK_FAILURE
-
-
-    def on_configure(self):
-        return Transition.TRANSITION_CALLBACK_SUCCESS
-
-    def on_cleanup(self):
-        return Transition.TRANSITION_CALLBACK_SUCCESS
-
-    def on_activate(self):
-        return Transition.TRANSITION_CALLBACK_SUCCESS
+    async def sleep(self, seconds):
+        await async_sleep(self, seconds, self.lifecycle_callback_group)
 
-    def on_deactivate(self):
-        return Transition.TRANSITION_CALLBACK_SUCCESS
+    def on_checkpoint(self):
+        return None
 
-    def on_error(self):
-        return Transition.TRANSITION_CALLBACK_SUCCESS
+    def on_restore(self, snapshot):
+        return Transition.TRANSITION_CALLBACK_FAILURE
 
-    def on_shutdown(self):
-        return Transition.TRANSITION_CALLBACK_SUCCESS
\ No newline at end of file
+    def on_reconfigure(self, changed):
+        return Transition.TRANSITION_CALLBACK_FAILURE
@@ -0,0 +1,105 @@
+import mmap
+import os
+import struct
+import tempfile
+
+
+_MAGIC = b'LCYCKPT1'
+# magic, primary state, snapshot length
+_HEADER = struct.Struct('<8sIQ')
+_STATE = struct.Struct('<8sI')
+
+
+def _write_atomic(path, *chunks):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class Checkpoint:
+    # Last stable primary state of a LifecycleNode and a snapshot of its
+    # configured resources, kept in two files so that state changes do not
+    # rewrite the snapshot:
+    #   <path>        header + snapshot, replaced atomically after configure
+    #   <path>.state  current primary state, replaced atomically per change
+    # load() maps the snapshot instead of reading it, the memoryview it
+    # returns stays valid until close() or the next save().
+
+    def __init__(self, path):
+        self.path = path
+        self.state_path = path + '.state'
+        self.file = None
+        self.mapping = None
+
+    def save(self, state, snapshot=b''):
+        self.close()
+        snapshot = memoryview(snapshot).cast('B')
+        _write_atomic(self.path, _HEADER.pack(_MAGIC, state, snapshot.nbytes), snapshot)
+        self.save_state(state)
+
+    def save_state(self, state):
+        _write_atomic(self.state_path, _STATE.pack(_MAGIC, state))
+
+    def load(self):
+        # Returns (state, snapshot) or (None, None) without a valid checkpoint.
+        self.close()
+        try:
+            self.file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None, None
+
+        # An empty file cannot be mapped, a truncated one is just as invalid.
+        if os.fstat(self.file.fileno()).st_size < _HEADER.size:
+            self.close()
+            return None, None
+        self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, state, length = _HEADER.unpack_from(self.mapping)
+        if magic != _MAGIC or len(self.mapping) != _HEADER.size + length:
+            self.close()
+            return None, None
+
+        try:
+            with open(self.state_path, 'rb') as f:
+                magic, latest_state = _STATE.unpack(f.read(_STATE.size))
+            if magic == _MAGIC:
+                state = latest_state
+        except (FileNotFoundError, struct.error):
+            pass
+
+        return state, memoryview(self.mapping)[_HEADER.size:]
+
+    def clear(self):
+        self.close()
+        for path in (self.path, self.state_path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        if self.mapping is not None:
+            try:
+                self.mapping.close()
+            except BufferError:
+                # A snapshot view is still referenced, the mapping is
+                # released together with it.
+                pass
+            self.mapping = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Only the standard library is imported here: the command talks to the
+# daemon (ros2_lifecycle_py.lifecycle_daemon) over a Unix socket and never
+# starts rclpy itself.
+
+
+def socket_path():
+    # One daemon per user and ROS domain.
+    return os.path.join(
+        os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir(),
+        'ros2_lifecycle_py_%d_%s.sock' % (os.getuid(), os.environ.get('ROS_DOMAIN_ID', '0')))
+
+
+def start_daemon():
+    subprocess.Popen(
+        [sys.executable, '-m', 'ros2_lifecycle_py.lifecycle_daemon'],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True)
+
+
+def connect(spawn=True, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    spawned = False
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path())
+            return sock
+        except (FileNotFoundError, ConnectionRefusedError):
+            sock.close()
+            if not spawn:
+                return None
+            if not spawned:
+                start_daemon()
+                spawned = True
+            if time.monotonic() > deadline:
+                raise RuntimeError('lifecycle daemon did not start within %.1f s' % timeout)
+            time.sleep(0.05)
+
+
+def request(sock, **command):
+    # Yields the daemon's results as they arrive.
+    sock.sendall((json.dumps(command) + '\n').encode())
+    with sock.makefile('rb') as lines:
+        for line in lines:
+            result = json.loads(line)
+            if result.get('done'):
+                return
+            yield result
+
+
+def print_results(results):
+    failed = False
+    matched = False
+    for result in results:
+        if 'error' in result:
+            print('error: ' + result['error'], file=sys.stderr)
+            failed = True
+            continue
+        matched = True
+        if 'state' in result:
+            print('%s: %s' % (result['node'], result['state'] or 'unavailable'), flush=True)
+            failed = failed or result['state'] is None
+        else:
+            print('%s: %s' % (result['node'], 'ok' if result['success'] else 'failed'),
+                  flush=True)
+            failed = failed or not result['success']
+    if not matched and not failed:
+        print('no matching nodes', file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='ros2_lifecycle_py',
+        description='Query and change the state of many lifecycle nodes at once')
+    parser.add_argument(
+        '--regex', action='store_true', help='node patterns are regular expressions')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    get = commands.add_parser('get', help='print the state of the matching nodes')
+    get.add_argument('pattern', nargs='?', default='*')
+    change = commands.add_parser('set', help='trigger a transition on the matching nodes')
+    change.add_argument('pattern')
+    change.add_argument(
+        'transition', choices=('configure', 'cleanup', 'activate', 'deactivate', 'shutdown'))
+    goto = commands.add_parser(
+        'goto', help='bring the matching nodes to a state through the shortest path')
+    goto.add_argument('pattern')
+    goto.add_argument('state', choices=('unconfigured', 'inactive', 'active', 'finalized'))
+    daemon = commands.add_parser('daemon', help='control the background daemon')
+    daemon.add_argument('action', choices=('start', 'stop', 'status'))
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'daemon':
+        sock = connect(spawn=args.action == 'start')
+        if sock is None:
+            print('not running')
+            return 0 if args.action == 'stop' else 1
+        with sock:
+            for _ in request(sock, command='stop' if args.action == 'stop' else 'ping'):
+                pass
+        print('stopped' if args.action == 'stop' else 'running')
+        return 0
+
+    command = vars(args)
+    with connect() as sock:
+        return print_results(request(sock, **command))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import json
+import time
+
+from rclpy.callback_groups import ReentrantCallbackGroup
+
+from lifecycle_msgs.msg import Transition
+from lifecycle_msgs.srv import ChangeState
+from lifecycle_msgs.srv import GetState
+
+from std_srvs.srv import Trigger
+
+from ros2_lifecycle_py.lifecycle import async_sleep
+from ros2_lifecycle_py.lifecycle import wait_for_future
+
+
+class LifecycleClient:
+    # Drives lifecycle nodes from `node`. Service clients are created once
+    # per target and service and reused, discovery is only waited for on
+    # first use. The coroutines must run on the executor of `node`; the
+    # *_many variants issue all requests before awaiting any response. With a
+    # tracer every call is a span on a '<node> -> <target>' track.
+
+    def __init__(self, node, callback_group=None, service_timeout=5.0, call_timeout=None,
+                 tracer=None):
+        self.node = node
+        self.tracer = tracer
+        self.callback_group = callback_group or ReentrantCallbackGroup()
+        self.service_timeout = service_timeout
+        self.call_timeout = call_timeout
+        self.clients = {}
+        self.discovered = set()
+
+    def get_client(self, srv_type, service):
+        client = self.clients.get(service)
+        if client is None:
+            client = self.clients[service] = self.node.create_client(
+                srv_type, service, callback_group=self.callback_group)
+        return client
+
+    def destroy(self):
+        for client in self.clients.values():
+            self.node.destroy_client(client)
+        self.clients.clear()
+        self.discovered.clear()
+
+    async def wait_for_service(self, client):
+        if client.srv_name in self.discovered:
+            return True
+
+        deadline = time.monotonic() + self.service_timeout
+        while not client.service_is_ready():
+            if time.monotonic() > deadline:
+                self.node.get_logger().error(client.srv_name + ' is not available')
+                return False
+            await async_sleep(self.node, 0.05, self.callback_group)
+
+        self.discovered.add(client.srv_name)
+        return True
+
+    async def call(self, srv_type, service, request, timeout=None):
+        if self.tracer is None:
+            return await self.call_untraced(srv_type, service, request, timeout)
+
+        begin = time.monotonic()
+        response = await self.call_untraced(srv_type, service, request, timeout)
+        target, _, name = service.rpartition('/')
+        self.tracer.record(
+            self.tracer.track(self.node.get_fully_qualified_name() + ' -> ' + target),
+            name, begin, answered=response is not None)
+        return response
+
+    async def call_untraced(self, srv_type, service, request, timeout=None):
+        client = self.get_client(srv_type, service)
+        if not await self.wait_for_service(client):
+            return None
+
+        future = client.call_async(request)
+        timeout = timeout or self.call_timeout
+        if timeout is not None and not await wait_for_future(
+                self.node, future, timeout, self.callback_group):
+            future.cancel()
+            self.node.get_logger().error(
+                '%s did not answer within %.3f s' % (client.srv_name, timeout))
+            return None
+        return await future
+
+    async def change_state(self, node_name, transition_id, timeout=None):
+        response = await self.call(
+            ChangeState,
+            node_name + '/change_state',
+            ChangeState.Request(transition=Transition(id=transition_id)),
+            timeout)
+        return response is not None and response.success
+
+    async def change_state_to(self, node_name, state_id, timeout=None):
+        response = await self.call(
+            ChangeState,
+            node_name + '/change_state_to',
+            ChangeState.Request(transition=Transition(id=state_id)),
+            timeout)
+        return response is not None and response.success
+
+    async def get_state(self, node_name, timeout=None):
+        response = await self.call(
+            GetState, node_name + '/get_state', GetState.Request(), timeout)
+        return None if response is None else response.current_state.id
+
+    async def get_transition_history(self, node_name, since_sequence=None,
+                                     since_timestamp=None, timeout=None):
+        # Events of the node's history after since_sequence/since_timestamp
+        # as dicts, None when the node did not answer.
+        response = await self.call(
+            Trigger, node_name + '/transition_history', Trigger.Request(), timeout)
+        if response is None:
+            return None
+        return [
+            event for event in json.loads(response.message)
+            if (since_sequence is None or event['sequence'] > since_sequence)
+            and (since_timestamp is None or event['timestamp'] > since_timestamp)
+        ]
+
+    async def change_state_many(self, node_names, transition_id, timeout=None):
+        return await self.gather(self.change_state, node_names, transition_id, timeout)
+
+    async def get_state_many(self, node_names, timeout=None):
+        return await self.gather(self.get_state, node_names, timeout)
+
+    async def gather(self, method, node_names, *args):
+        tasks = {
+            name: self.node.executor.create_task(method, name, *args) for name in node_names
+        }
+        return {name: await task for name, task in tasks.items()}
+
+    def change_state_async(self, node_name, transition_id, timeout=None):
+        return self.node.executor.create_task(
+            self.change_state, node_name, transition_id, timeout)
+
+    def get_state_async(self, node_name, timeout=None):
+        return self.node.executor.create_task(self.get_state, node_name, timeout)
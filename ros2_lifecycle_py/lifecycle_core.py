@@ -0,0 +1,552 @@
+import asyncio
+from collections import deque
+from collections import namedtuple
+from functools import lru_cache
+import inspect
+import logging
+import threading
+import time
+
+# The lifecycle state machine without ROS: no rclpy, no messages, nothing
+# outside the standard library. LifecycleNode adapts it to a ROS node; on
+# its own it runs under asyncio or, with synchronous callbacks, under
+# run_sync(), so large fleets of instances can be simulated in one process.
+
+
+class StateId:
+    # Same values as lifecycle_msgs/msg/State.
+    PRIMARY_STATE_UNKNOWN = 0
+    PRIMARY_STATE_UNCONFIGURED = 1
+    PRIMARY_STATE_INACTIVE = 2
+    PRIMARY_STATE_ACTIVE = 3
+    PRIMARY_STATE_FINALIZED = 4
+    TRANSITION_STATE_CONFIGURING = 10
+    TRANSITION_STATE_CLEANINGUP = 11
+    TRANSITION_STATE_SHUTTINGDOWN = 12
+    TRANSITION_STATE_ACTIVATING = 13
+    TRANSITION_STATE_DEACTIVATING = 14
+    TRANSITION_STATE_ERRORPROCESSING = 15
+
+
+class TransitionId:
+    # Same values as lifecycle_msgs/msg/Transition.
+    TRANSITION_CREATE = 0
+    TRANSITION_CONFIGURE = 1
+    TRANSITION_CLEANUP = 2
+    TRANSITION_ACTIVATE = 3
+    TRANSITION_DEACTIVATE = 4
+    TRANSITION_UNCONFIGURED_SHUTDOWN = 5
+    TRANSITION_INACTIVE_SHUTDOWN = 6
+    TRANSITION_ACTIVE_SHUTDOWN = 7
+    TRANSITION_DESTROY = 8
+    TRANSITION_ON_CONFIGURE_SUCCESS = 10
+    TRANSITION_ON_CONFIGURE_FAILURE = 11
+    TRANSITION_ON_CONFIGURE_ERROR = 12
+    TRANSITION_ON_CLEANUP_SUCCESS = 20
+    TRANSITION_ON_CLEANUP_FAILURE = 21
+    TRANSITION_ON_CLEANUP_ERROR = 22
+    TRANSITION_ON_ACTIVATE_SUCCESS = 30
+    TRANSITION_ON_ACTIVATE_FAILURE = 31
+    TRANSITION_ON_ACTIVATE_ERROR = 32
+    TRANSITION_ON_DEACTIVATE_SUCCESS = 40
+    TRANSITION_ON_DEACTIVATE_FAILURE = 41
+    TRANSITION_ON_DEACTIVATE_ERROR = 42
+    TRANSITION_ON_SHUTDOWN_SUCCESS = 50
+    TRANSITION_ON_SHUTDOWN_FAILURE = 51
+    TRANSITION_ON_SHUTDOWN_ERROR = 52
+    TRANSITION_ON_ERROR_SUCCESS = 60
+    TRANSITION_ON_ERROR_FAILURE = 61
+    TRANSITION_ON_ERROR_ERROR = 62
+    TRANSITION_CALLBACK_SUCCESS = 97
+    TRANSITION_CALLBACK_FAILURE = 98
+    TRANSITION_CALLBACK_ERROR = 99
+
+
+def _build_names(ids):
+    names = {}
+    for key, value in vars(ids).items():
+        if not key.startswith('_') and isinstance(value, int):
+            names.setdefault(value, key)
+    return names
+
+
+# 3 -> 'PRIMARY_STATE_ACTIVE', 1 -> 'TRANSITION_CONFIGURE', ... the labels of
+# the lifecycle_msgs State and Transition messages.
+STATE_NAMES = _build_names(StateId)
+TRANSITION_NAMES = _build_names(TransitionId)
+
+# 3 -> 'active', 14 -> 'deactivating', ... the short labels of the command
+# line, the daemon and the heartbeat.
+STATE_LABELS = {
+    state_id: name.split('_STATE_', 1)[1].lower() for state_id, name in STATE_NAMES.items()
+}
+
+
+# transition_state: the intermediate state entered while the callback runs.
+# callback: name of the method implementing the transition.
+# outcomes: callback return code -> (result transition, goal state). Return
+#   codes without an entry are handled as TRANSITION_CALLBACK_ERROR.
+TransitionSpec = namedtuple('TransitionSpec', ['transition_state', 'callback', 'outcomes'])
+
+
+def _shutdown_spec():
+    return TransitionSpec(
+        StateId.TRANSITION_STATE_SHUTTINGDOWN, 'on_shutdown', {
+            TransitionId.TRANSITION_CALLBACK_SUCCESS: (
+                TransitionId.TRANSITION_ON_SHUTDOWN_SUCCESS, StateId.PRIMARY_STATE_FINALIZED),
+            TransitionId.TRANSITION_CALLBACK_ERROR: (
+                TransitionId.TRANSITION_ON_SHUTDOWN_ERROR,
+                StateId.TRANSITION_STATE_ERRORPROCESSING),
+        })
+
+
+# (state, transition) -> TransitionSpec
+TRANSITION_TABLE = {
+    (StateId.PRIMARY_STATE_UNCONFIGURED, TransitionId.TRANSITION_CONFIGURE): TransitionSpec(
+        StateId.TRANSITION_STATE_CONFIGURING, 'on_configure', {
+            TransitionId.TRANSITION_CALLBACK_SUCCESS: (
+                TransitionId.TRANSITION_ON_CONFIGURE_SUCCESS, StateId.PRIMARY_STATE_INACTIVE),
+            TransitionId.TRANSITION_CALLBACK_FAILURE: (
+                TransitionId.TRANSITION_ON_CONFIGURE_FAILURE, StateId.PRIMARY_STATE_UNCONFIGURED),
+            TransitionId.TRANSITION_CALLBACK_ERROR: (
+                TransitionId.TRANSITION_ON_CONFIGURE_ERROR,
+                StateId.TRANSITION_STATE_ERRORPROCESSING),
+        }),
+    (StateId.PRIMARY_STATE_INACTIVE, TransitionId.TRANSITION_CLEANUP): TransitionSpec(
+        StateId.TRANSITION_STATE_CLEANINGUP, 'on_cleanup', {
+            TransitionId.TRANSITION_CALLBACK_SUCCESS: (
+                TransitionId.TRANSITION_ON_CLEANUP_SUCCESS, StateId.PRIMARY_STATE_UNCONFIGURED),
+            TransitionId.TRANSITION_CALLBACK_ERROR: (
+                TransitionId.TRANSITION_ON_CLEANUP_ERROR,
+                StateId.TRANSITION_STATE_ERRORPROCESSING),
+        }),
+    (StateId.PRIMARY_STATE_INACTIVE, TransitionId.TRANSITION_ACTIVATE): TransitionSpec(
+        StateId.TRANSITION_STATE_ACTIVATING, 'on_activate', {
+            TransitionId.TRANSITION_CALLBACK_SUCCESS: (
+                TransitionId.TRANSITION_ON_ACTIVATE_SUCCESS, StateId.PRIMARY_STATE_ACTIVE),
+            TransitionId.TRANSITION_CALLBACK_FAILURE: (
+                TransitionId.TRANSITION_ON_ACTIVATE_FAILURE, StateId.PRIMARY_STATE_INACTIVE),
+            TransitionId.TRANSITION_CALLBACK_ERROR: (
+                TransitionId.TRANSITION_ON_ACTIVATE_ERROR,
+                StateId.TRANSITION_STATE_ERRORPROCESSING),
+        }),
+    (StateId.PRIMARY_STATE_ACTIVE, TransitionId.TRANSITION_DEACTIVATE): TransitionSpec(
+        StateId.TRANSITION_STATE_DEACTIVATING, 'on_deactivate', {
+            TransitionId.TRANSITION_CALLBACK_SUCCESS: (
+                TransitionId.TRANSITION_ON_DEACTIVATE_SUCCESS, StateId.PRIMARY_STATE_INACTIVE),
+            TransitionId.TRANSITION_CALLBACK_ERROR: (
+                TransitionId.TRANSITION_ON_DEACTIVATE_ERROR,
+                StateId.TRANSITION_STATE_ERRORPROCESSING),
+        }),
+    (StateId.PRIMARY_STATE_UNCONFIGURED, TransitionId.TRANSITION_UNCONFIGURED_SHUTDOWN):
+        _shutdown_spec(),
+    (StateId.PRIMARY_STATE_INACTIVE, TransitionId.TRANSITION_INACTIVE_SHUTDOWN):
+        _shutdown_spec(),
+    (StateId.PRIMARY_STATE_ACTIVE, TransitionId.TRANSITION_ACTIVE_SHUTDOWN):
+        _shutdown_spec(),
+}
+
+# Entered after any TRANSITION_ON_*_ERROR, runs on_error.
+ERROR_PROCESSING_SPEC = TransitionSpec(
+    StateId.TRANSITION_STATE_ERRORPROCESSING, 'on_error', {
+        TransitionId.TRANSITION_CALLBACK_SUCCESS: (
+            TransitionId.TRANSITION_ON_ERROR_SUCCESS, StateId.PRIMARY_STATE_UNCONFIGURED),
+        TransitionId.TRANSITION_CALLBACK_FAILURE: (
+            TransitionId.TRANSITION_ON_ERROR_FAILURE, StateId.PRIMARY_STATE_FINALIZED),
+        TransitionId.TRANSITION_CALLBACK_ERROR: (
+            TransitionId.TRANSITION_ON_ERROR_ERROR, StateId.PRIMARY_STATE_FINALIZED),
+    })
+
+# Any of the shutdown transitions is accepted from any primary state, the one
+# matching the current state is used.
+SHUTDOWN_TRANSITIONS = {
+    StateId.PRIMARY_STATE_UNCONFIGURED: TransitionId.TRANSITION_UNCONFIGURED_SHUTDOWN,
+    StateId.PRIMARY_STATE_INACTIVE: TransitionId.TRANSITION_INACTIVE_SHUTDOWN,
+    StateId.PRIMARY_STATE_ACTIVE: TransitionId.TRANSITION_ACTIVE_SHUTDOWN,
+}
+SHUTDOWN_TRANSITION_IDS = frozenset(SHUTDOWN_TRANSITIONS.values())
+
+TRANSITION_STATES = frozenset(
+    [spec.transition_state for spec in TRANSITION_TABLE.values()]
+    + [StateId.TRANSITION_STATE_ERRORPROCESSING])
+
+# Primary states go_to_state() can be asked for.
+GOAL_STATES = frozenset((
+    StateId.PRIMARY_STATE_UNCONFIGURED,
+    StateId.PRIMARY_STATE_INACTIVE,
+    StateId.PRIMARY_STATE_ACTIVE,
+    StateId.PRIMARY_STATE_FINALIZED,
+))
+
+
+@lru_cache(maxsize=None)
+def plan_transitions(start_state, goal_state):
+    # Shortest sequence of transition ids from start_state to goal_state
+    # assuming every callback succeeds, None if there is none.
+    paths = {start_state: ()}
+    frontier = [start_state]
+    while frontier:
+        next_frontier = []
+        for state in frontier:
+            if state == goal_state:
+                return paths[state]
+            for (spec_state, transition_id), spec in TRANSITION_TABLE.items():
+                if spec_state != state:
+                    continue
+                next_state = spec.outcomes[TransitionId.TRANSITION_CALLBACK_SUCCESS][1]
+                if next_state not in paths:
+                    paths[next_state] = paths[state] + (transition_id,)
+                    next_frontier.append(next_state)
+        frontier = next_frontier
+    return None
+
+
+# source is the LifecycleStateMachine the event comes from, callback_duration
+# in seconds (0.0 for the events starting a transition).
+LifecycleEvent = namedtuple(
+    'LifecycleEvent',
+    ['source', 'timestamp', 'transition', 'start_state', 'goal_state', 'callback_duration'])
+
+
+class EventBus:
+    # In-process fan-out of the LifecycleEvents of any number of state
+    # machines. Subscribers are called synchronously in publish(); with
+    # history > 0 the last events are kept for inspection.
+
+    def __init__(self, history=0):
+        self.subscribers = []
+        self.history = deque(maxlen=history) if history > 0 else None
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def publish(self, event):
+        if self.history is not None:
+            self.history.append(event)
+        for callback in self.subscribers:
+            callback(event)
+
+
+class Waiter:
+    # Awaitable result for create_future() outside of an event loop.
+
+    def __init__(self):
+        self._done = False
+        self._result = None
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        return self._result
+
+    def set_result(self, result):
+        self._result = result
+        self._done = True
+
+    def __await__(self):
+        while not self._done:
+            yield
+        return self._result
+
+
+def run_sync(coroutine):
+    # Runs coroutine without an event loop. Only possible when it never has
+    # to wait, i.e. all transition callbacks are synchronous.
+    try:
+        coroutine.send(None)
+    except StopIteration as e:
+        return e.value
+    coroutine.close()
+    raise RuntimeError('coroutine suspended, run it on an event loop')
+
+
+class LifecycleStateMachine:
+    # The managed lifecycle: states, transitions, on_* callbacks, error
+    # processing and goal-state planning. Subclasses override the on_*
+    # callbacks; they may return a code or an awaitable of one. Timeouts are
+    # kept here but only enforced by adapters that have timers
+    # (LifecycleNode), the run_transition_callback() here awaits without a
+    # deadline.
+
+    def __init__(self, transition_timeout=None, transition_timeouts=None, bus=None,
+                 clock=time.time_ns, tracer=None, trace_name='lifecycle'):
+        self.state = StateId.PRIMARY_STATE_UNKNOWN
+
+        # Guards the check of a requested transition against the current
+        # state together with entering its transition state: on a
+        # multithreaded executor two requests may arrive at the same time.
+        self.transition_lock = threading.RLock()
+
+        # Optional lifecycle_tracing.Tracer, the spans of this machine go to
+        # the trace_name track.
+        self.tracer = tracer
+        self.trace_track = None if tracer is None else tracer.track(trace_name)
+
+        # Event timestamps in nanoseconds come from clock, simulations can
+        # pass a virtual one.
+        self.bus = bus
+        self.clock = clock
+
+        # Deadlines in seconds for the on_* callbacks, None means unbounded.
+        # transition_timeouts overrides transition_timeout per transition id,
+        # a timeout given for one of the shutdown transitions covers all three.
+        self.transition_timeout = transition_timeout
+        self.transition_timeouts = {}
+        for transition_id, timeout in (transition_timeouts or {}).items():
+            if transition_id in SHUTDOWN_TRANSITION_IDS:
+                for shutdown_id in SHUTDOWN_TRANSITION_IDS:
+                    self.transition_timeouts.setdefault(shutdown_id, timeout)
+            self.transition_timeouts[transition_id] = timeout
+
+        # go_to_state(): the latest requested goal, when the oldest request
+        # not served by a transition yet was made, the (goal, future) of
+        # every caller waiting for the current drive and whether it runs.
+        self.goal_state = None
+        self.goal_requested_at = None
+        self.goal_waiters = []
+        self.driving = False
+
+        # Futures resolved whenever a transition callback has finished.
+        self.transition_waiters = []
+
+    def get_logger(self):
+        return logging.getLogger('lifecycle')
+
+    def create_future(self):
+        try:
+            return asyncio.get_running_loop().create_future()
+        except RuntimeError:
+            return Waiter()
+
+    def publish_transition_event(self, transition, start_state, goal_state,
+                                 callback_duration=0.0, timestamp=None):
+        if self.bus is not None:
+            self.bus.publish(LifecycleEvent(
+                self, self.clock() if timestamp is None else timestamp,
+                transition, start_state, goal_state, callback_duration))
+
+    def record_transition_statistics(self, name, result, duration, callback_duration, queued):
+        pass
+
+    async def apply_transition(self, transition_id, requested_at=None):
+        # requested_at is the time.monotonic() the request entered a queue,
+        # e.g. when a task running it was created. Only requests with one
+        # are recorded as queued.
+        if transition_id == TransitionId.TRANSITION_CREATE:
+            return self.create()
+
+        elif transition_id == TransitionId.TRANSITION_DESTROY:
+            return self.destroy()
+
+        else:
+            return await self.trigger_transition(transition_id, requested_at)
+
+    async def go_to_state(self, goal_state):
+        # Runs the shortest transition path to goal_state. Requests made while
+        # a path is being driven replace its goal instead of queueing their
+        # own transitions (last writer wins); every caller gets whether the
+        # machine ended up in the state it asked for.
+        if goal_state not in GOAL_STATES:
+            return False
+
+        future = self.create_future()
+        with self.transition_lock:
+            self.goal_state = goal_state
+            if self.goal_requested_at is None:
+                self.goal_requested_at = time.monotonic()
+            self.goal_waiters.append((goal_state, future))
+            drive = not self.driving
+            self.driving = True
+        if drive:
+            await self.drive_to_goal()
+        return await future
+
+    async def drive_to_goal(self):
+        # Started by go_to_state with driving set. Each step, ending the drive
+        # included, is decided under transition_lock: a goal set meanwhile is
+        # either still driven here or finds driving cleared and starts a drive
+        # of its own, there is never more than one.
+        waiters = None
+        try:
+            while waiters is None:
+                future = transition_id = None
+                with self.transition_lock:
+                    if self.state in TRANSITION_STATES:
+                        # A transition requested through apply_transition is running.
+                        future = self.create_future()
+                        self.transition_waiters.append(future)
+                    else:
+                        path = plan_transitions(self.state, self.goal_state)
+                        if path:
+                            transition_id = path[0]
+                            requested_at, self.goal_requested_at = self.goal_requested_at, None
+                        else:
+                            waiters = self.end_drive()
+
+                if future is not None:
+                    await future
+                elif transition_id is not None:
+                    result = await self.trigger_transition(transition_id, requested_at)
+                    if result != TransitionId.TRANSITION_CALLBACK_SUCCESS:
+                        with self.transition_lock:
+                            waiters = self.end_drive()
+        finally:
+            if waiters is None:
+                with self.transition_lock:
+                    waiters = self.end_drive()
+            for goal_state, future in waiters:
+                future.set_result(self.state == goal_state)
+
+    def end_drive(self):
+        # Called under transition_lock, returns the waiters to resolve.
+        self.driving = False
+        self.goal_requested_at = None
+        waiters, self.goal_waiters = self.goal_waiters, []
+        return waiters
+
+    async def trigger_transition(self, transition_id, requested_at=None):
+        started_at = time.monotonic()
+        entered = self.enter_transition(transition_id)
+        if entered is None:
+            return TransitionId.TRANSITION_CALLBACK_FAILURE
+
+        transition_id, start_state, spec = entered
+        self.publish_transition_event(transition_id, start_state, self.state)
+        if self.tracer is not None:
+            self.tracer.record(self.trace_track, 'publish', started_at)
+
+        result = await self.execute_transition(
+            spec,
+            self.transition_timeouts.get(transition_id, self.transition_timeout),
+            started_at,
+            requested_at)
+
+        if self.state == StateId.TRANSITION_STATE_ERRORPROCESSING:
+            await self.process_error(spec)
+
+        if self.tracer is not None:
+            if requested_at is not None:
+                self.tracer.record(self.trace_track, 'queued', requested_at, started_at)
+            self.tracer.record(
+                self.trace_track, spec.callback[len('on_'):],
+                started_at if requested_at is None else requested_at,
+                transition=transition_id, result=result, state=self.state)
+
+        return result
+
+    def enter_transition(self, transition_id):
+        # Moves to the transition state of transition_id, returns the
+        # (transition id, start state, spec) or None when it is not possible
+        # from the current state.
+        with self.transition_lock:
+            if transition_id in SHUTDOWN_TRANSITION_IDS:
+                transition_id = SHUTDOWN_TRANSITIONS.get(self.state, transition_id)
+
+            spec = TRANSITION_TABLE.get((self.state, transition_id))
+            if spec is None:
+                return None
+
+            start_state = self.state
+            self.state = spec.transition_state
+            return transition_id, start_state, spec
+
+    async def execute_transition(self, spec, timeout, started_at, requested_at,
+                                 callback=None, name=None):
+        name = name or spec.callback[len('on_'):]
+        callback_started_at = time.monotonic()
+        result = await self.run_transition_callback(
+            callback or getattr(self, spec.callback), timeout)
+        callback_finished_at = time.monotonic()
+        callback_duration = callback_finished_at - callback_started_at
+
+        result_transition, self.state = spec.outcomes.get(
+            result, spec.outcomes[TransitionId.TRANSITION_CALLBACK_ERROR])
+        self.publish_transition_event(
+            result_transition, spec.transition_state, self.state, callback_duration)
+
+        if self.tracer is not None:
+            self.tracer.record(
+                self.trace_track, 'on_' + name, callback_started_at, callback_finished_at,
+                result=result)
+            self.tracer.record(self.trace_track, 'publish', callback_finished_at)
+
+        self.record_transition_statistics(
+            name, result, time.monotonic() - started_at, callback_duration,
+            None if requested_at is None else started_at - requested_at)
+
+        waiters, self.transition_waiters = self.transition_waiters, []
+        for future in waiters:
+            future.set_result(None)
+
+        return result
+
+    async def process_error(self, failed_spec):
+        await self.execute_transition(
+            ERROR_PROCESSING_SPEC, self.transition_timeout, time.monotonic(), None)
+
+    async def run_transition_callback(self, callback, timeout=None, args=()):
+        try:
+            result = callback(*args)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            self.get_logger().error('%s() raised %r' % (callback.__name__, e))
+            return TransitionId.TRANSITION_CALLBACK_ERROR
+
+    def create(self):
+        if self.state == StateId.PRIMARY_STATE_UNKNOWN:
+            self.publish_transition_event(
+                TransitionId.TRANSITION_CREATE,
+                StateId.PRIMARY_STATE_UNKNOWN,
+                StateId.PRIMARY_STATE_UNCONFIGURED)
+
+            self.state = StateId.PRIMARY_STATE_UNCONFIGURED
+            return TransitionId.TRANSITION_CALLBACK_SUCCESS
+        else:
+            return TransitionId.TRANSITION_CALLBACK_FAILURE
+
+    def destroy(self):
+        if self.state == StateId.PRIMARY_STATE_FINALIZED:
+            return TransitionId.TRANSITION_CALLBACK_SUCCESS
+        else:
+            return TransitionId.TRANSITION_CALLBACK_FAILURE
+
+    async def configure(self):
+        return await self.trigger_transition(TransitionId.TRANSITION_CONFIGURE)
+
+    async def cleanup(self):
+        return await self.trigger_transition(TransitionId.TRANSITION_CLEANUP)
+
+    async def activate(self):
+        return await self.trigger_transition(TransitionId.TRANSITION_ACTIVATE)
+
+    async def deactivate(self):
+        return await self.trigger_transition(TransitionId.TRANSITION_DEACTIVATE)
+
+    async def shutdown(self):
+        return await self.trigger_transition(SHUTDOWN_TRANSITIONS.get(
+            self.state, TransitionId.TRANSITION_ACTIVE_SHUTDOWN))
+
+    def on_configure(self):
+        return TransitionId.TRANSITION_CALLBACK_SUCCESS
+
+    def on_cleanup(self):
+        return TransitionId.TRANSITION_CALLBACK_SUCCESS
+
+    def on_activate(self):
+        return TransitionId.TRANSITION_CALLBACK_SUCCESS
+
+    def on_deactivate(self):
+        return TransitionId.TRANSITION_CALLBACK_SUCCESS
+
+    def on_error(self):
+        return TransitionId.TRANSITION_CALLBACK_SUCCESS
+
+    def on_shutdown(self):
+        return TransitionId.TRANSITION_CALLBACK_SUCCESS
@@ -0,0 +1,174 @@
+import fnmatch
+import json
+import os
+import re
+import socketserver
+import threading
+import time
+
+import rclpy
+from rclpy.callback_groups import ReentrantCallbackGroup
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.node import Node
+
+from lifecycle_msgs.msg import Transition
+
+from ros2_lifecycle_py.lifecycle import async_sleep
+from ros2_lifecycle_py.lifecycle_cli import socket_path
+from ros2_lifecycle_py.lifecycle_client import LifecycleClient
+from ros2_lifecycle_py.lifecycle_core import STATE_LABELS
+
+
+TRANSITIONS = {
+    'configure': Transition.TRANSITION_CONFIGURE,
+    'cleanup': Transition.TRANSITION_CLEANUP,
+    'activate': Transition.TRANSITION_ACTIVATE,
+    'deactivate': Transition.TRANSITION_DEACTIVATE,
+    # resolved by the node to the shutdown matching its state
+    'shutdown': Transition.TRANSITION_UNCONFIGURED_SHUTDOWN,
+}
+
+STATE_IDS = {label: state_id for state_id, label in STATE_LABELS.items()}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    # One JSON request line in, one JSON line per result out, terminated by
+    # {"done": true}.
+
+    def handle(self):
+        line = self.rfile.readline()
+        if line:
+            self.server.daemon_node.handle(json.loads(line), self.wfile)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class LifecycleDaemon(Node):
+    # Long-lived node behind the ros2_lifecycle_py command. It keeps the
+    # graph and the lifecycle service clients of every node it talked to
+    # warm, so commands skip rclpy start-up and discovery.
+
+    def __init__(self, node_name='ros2_lifecycle_py_daemon', service_timeout=2.0,
+                 transition_timeout=30.0, discovery_timeout=2.0):
+        super().__init__(node_name)
+        # The daemon is started by the first command, which must not see the
+        # graph before discovery had a chance to fill it.
+        self.discovery_deadline = time.monotonic() + discovery_timeout
+        self.callback_group = ReentrantCallbackGroup()
+        self.lifecycle_client = LifecycleClient(
+            self, self.callback_group, service_timeout, transition_timeout)
+        self.stopping = False
+
+    def lifecycle_nodes(self):
+        return sorted(
+            name[:-len('/get_state')]
+            for name, types in self.get_service_names_and_types()
+            if name.endswith('/get_state') and 'lifecycle_msgs/srv/GetState' in types)
+
+    async def match(self, pattern, regex=False):
+        # Nothing matching during discovery is retried until it is over.
+        if regex:
+            expression = re.compile(pattern)
+            matches = expression.fullmatch
+        else:
+            def matches(name):
+                return fnmatch.fnmatchcase(name, pattern)
+        while True:
+            names = [name for name in self.lifecycle_nodes() if matches(name)]
+            if names or time.monotonic() >= self.discovery_deadline:
+                return names
+            await async_sleep(self, 0.1, self.callback_group)
+
+    def handle(self, request, wfile):
+        # Called on a socket thread, the command itself runs on the executor.
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def emit(**result):
+            line = (json.dumps(result) + '\n').encode()
+            with lock:
+                try:
+                    wfile.write(line)
+                    wfile.flush()
+                except OSError:
+                    pass
+
+        task = self.executor.create_task(self.run_command, request, emit)
+        task.add_done_callback(lambda _: done.set())
+        self.executor.wake()
+        done.wait()
+        emit(done=True)
+
+    async def run_command(self, request, emit):
+        # Bad requests are reported to the client, an exception escaping
+        # the task would be raised out of the daemon's spin.
+        try:
+            await self.execute(request, emit)
+        except (KeyError, ValueError, re.error) as e:
+            emit(error='%s: %s' % (type(e).__name__, e))
+
+    async def execute(self, request, emit):
+        command = request['command']
+        if command == 'stop':
+            self.stopping = True
+            return
+        if command == 'ping':
+            return
+
+        names = await self.match(request.get('pattern', '*'), request.get('regex', False))
+        if command == 'get':
+            await self.stream(
+                names, self.lifecycle_client.get_state,
+                lambda name, state: emit(node=name, state=STATE_LABELS.get(state)))
+        elif command == 'set':
+            await self.stream(
+                names, self.lifecycle_client.change_state,
+                lambda name, success: emit(node=name, success=success),
+                TRANSITIONS[request['transition']])
+        elif command == 'goto':
+            await self.stream(
+                names, self.lifecycle_client.change_state_to,
+                lambda name, success: emit(node=name, success=success),
+                STATE_IDS[request['state']])
+        else:
+            raise ValueError('unknown command %r' % command)
+
+    async def stream(self, names, method, emit, *args):
+        # The calls run concurrently, their results are emitted in the order
+        # of names. Emitting from here and not from done callbacks, which
+        # the executor runs as tasks of their own, guarantees every result
+        # is written before handle() ends the response.
+        tasks = [(name, self.executor.create_task(method, name, *args)) for name in names]
+        for name, task in tasks:
+            emit(name, await task)
+
+
+def main(args=None):
+    rclpy.init(args=args)
+
+    daemon = LifecycleDaemon()
+    executor = MultiThreadedExecutor()
+    executor.add_node(daemon)
+
+    path = socket_path()
+    if os.path.exists(path):
+        os.unlink(path)
+    server = _Server(path, _RequestHandler)
+    server.daemon_node = daemon
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        while rclpy.ok() and not daemon.stopping:
+            executor.spin_once(timeout_sec=0.1)
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.unlink(path)
+        daemon.destroy_node()
+        rclpy.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+import time
+
+import rclpy
+from rclpy.duration import Duration
+from rclpy.node import Node
+from rclpy.qos import LivelinessPolicy
+from rclpy.qos import QoSProfile
+from rclpy.qos import ReliabilityPolicy
+
+try:
+    from rclpy.event_handler import PublisherEventCallbacks
+    from rclpy.event_handler import SubscriptionEventCallbacks
+except ImportError:  # Humble
+    from rclpy.qos_event import PublisherEventCallbacks
+    from rclpy.qos_event import SubscriptionEventCallbacks
+
+from diagnostic_msgs.msg import DiagnosticArray
+from diagnostic_msgs.msg import DiagnosticStatus
+from diagnostic_msgs.msg import KeyValue
+
+from ros2_lifecycle_py.lifecycle_core import STATE_LABELS
+from ros2_lifecycle_py.managed_entities import ManagedEntity
+
+
+# Shared by every node, the monitor tells them apart by DiagnosticStatus.name.
+HEARTBEAT_TOPIC = '/lifecycle_heartbeat'
+
+# Number of periods a node may stay silent before it is considered stalled.
+DEFAULT_WINDOW = 3.0
+
+def heartbeat_qos(period, window=DEFAULT_WINDOW, depth=1):
+    # Only the latest beat matters, so best effort. Liveliness is asserted by
+    # the beats themselves (MANUAL_BY_TOPIC), a wedged executor therefore
+    # loses liveliness just like a dead process.
+    return QoSProfile(
+        depth=depth,
+        reliability=ReliabilityPolicy.BEST_EFFORT,
+        deadline=Duration(seconds=window * period),
+        liveliness=LivelinessPolicy.MANUAL_BY_TOPIC,
+        liveliness_lease_duration=Duration(seconds=window * period))
+
+
+class Heartbeat(ManagedEntity):
+    # Beats every `period` seconds while the node is active. The message is
+    # a DiagnosticStatus: name is the node, message its state, values the
+    # period and the lag of the beat behind its schedule, i.e. how long the
+    # timer callback waited in the executor queue. On deactivation one last
+    # beat carries the transition state, so the monitor can tell a node
+    # leaving ACTIVE from a stalled one.
+    #
+    # The timer is in the default callback group of the node on purpose: if
+    # the callbacks of the node are stuck, the heartbeat is stuck with them.
+
+    def __init__(self, node, period, topic=HEARTBEAT_TOPIC, window=DEFAULT_WINDOW):
+        super().__init__(False)
+        self.node = node
+        self.period = period
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.scheduled = 0.0
+
+        self.msg = DiagnosticStatus(
+            name=node.get_fully_qualified_name(),
+            values=[KeyValue(key='period', value=repr(period)), KeyValue(key='lag')])
+        self.publisher = node.create_publisher(
+            DiagnosticStatus, topic, heartbeat_qos(period, window),
+            event_callbacks=PublisherEventCallbacks(deadline=self.deadline_missed))
+        self.timer = node.create_timer(period, self.beat)
+        self.timer.cancel()
+
+    def on_activate(self):
+        super().on_activate()
+        self.lag = 0.0
+        self.scheduled = time.monotonic() + self.period
+        self.timer.reset()
+        self.publish(0.0)
+
+    def on_deactivate(self):
+        super().on_deactivate()
+        self.timer.cancel()
+        self.publish(0.0)
+
+    def beat(self):
+        # The timer skips the periods it missed, so does the schedule.
+        now = time.monotonic()
+        lag = now - self.scheduled
+        self.scheduled += self.period * (1 + int(max(lag, 0.0) // self.period))
+        self.lag = max(lag, 0.0)
+        self.max_lag = max(self.max_lag, self.lag)
+        self.publish(self.lag)
+
+    def publish(self, lag):
+        msg = self.msg
+        msg.message = STATE_LABELS.get(self.node.state, '')
+        msg.level = DiagnosticStatus.WARN if lag > self.period else DiagnosticStatus.OK
+        msg.values[1].value = '%.6f' % lag
+        self.publisher.publish(msg)
+
+    def deadline_missed(self, status):
+        if self.active:
+            self.node.get_logger().warn(
+                'heartbeat missed its deadline %d times' % status.total_count)
+
+    def destroy(self):
+        self.node.destroy_timer(self.timer)
+        self.node.destroy_publisher(self.publisher)
+
+
+class HeartbeatMonitor(Node):
+    # Watches the heartbeat topic and flags every node that was active and
+    # did not beat for `window` of its own periods. Times are taken on
+    # reception, so the clocks of the monitored hosts do not matter. The
+    # status of all known nodes is published on <node_name>/status whenever
+    # one of them changes.
+
+    def __init__(self, node_name='lifecycle_heartbeat_monitor'):
+        super().__init__(node_name)
+
+        self.declare_parameter('topic', HEARTBEAT_TOPIC)
+        self.declare_parameter('window', DEFAULT_WINDOW)
+        self.declare_parameter('check_period', 0.05)
+
+        self.window = self.get_parameter('window').value
+
+        # name -> [last reception, period, state label, lag, stalled]
+        self.nodes = {}
+
+        # The requested deadline and lease are left infinite so publishers of
+        # any period match, liveliness changes only trigger an early check.
+        self.sub_heartbeat = self.create_subscription(
+            DiagnosticStatus,
+            self.get_parameter('topic').value,
+            self.heartbeat_callback,
+            QoSProfile(depth=100, reliability=ReliabilityPolicy.BEST_EFFORT),
+            event_callbacks=SubscriptionEventCallbacks(liveliness=self.liveliness_changed))
+        self.pub_status = self.create_publisher(DiagnosticArray, node_name + '/status', 10)
+        self.check_timer = self.create_timer(
+            self.get_parameter('check_period').value, self.check)
+
+    def heartbeat_callback(self, msg):
+        now = time.monotonic()
+        values = {kv.key: kv.value for kv in msg.values}
+        node = self.nodes.get(msg.name)
+        changed = node is None or node[2] != msg.message
+        if node is None:
+            node = self.nodes[msg.name] = [now, 0.0, '', 0.0, False]
+        elif node[4]:
+            node[4] = False
+            changed = True
+            self.on_recovered(msg.name, now - node[0])
+        node[0] = now
+        node[1] = float(values.get('period', 0.0))
+        node[2] = msg.message
+        node[3] = float(values.get('lag', 0.0))
+        if node[3] > node[1]:
+            self.get_logger().warn('%s heartbeat is %.3f s late' % (msg.name, node[3]))
+        if changed:
+            self.publish_status()
+
+    def liveliness_changed(self, status):
+        if status.not_alive_count_change > 0:
+            self.check()
+
+    def check(self):
+        now = time.monotonic()
+        changed = False
+        for name, node in self.nodes.items():
+            last, period, state, _, stalled = node
+            if stalled or state != 'active':
+                continue
+            silence = now - last
+            if silence > self.window * period:
+                node[4] = True
+                changed = True
+                self.on_stalled(name, silence)
+        if changed:
+            self.publish_status()
+
+    def get_stalled(self):
+        return sorted(name for name, node in self.nodes.items() if node[4])
+
+    def publish_status(self):
+        msg = DiagnosticArray()
+        msg.header.stamp = self.get_clock().now().to_msg()
+        for name, (last, period, state, lag, stalled) in sorted(self.nodes.items()):
+            if stalled:
+                level, message = DiagnosticStatus.ERROR, 'stalled'
+            elif state == 'errorprocessing':
+                level, message = DiagnosticStatus.ERROR, state
+            elif state == 'active' and lag > period:
+                level, message = DiagnosticStatus.WARN, state
+            else:
+                level, message = DiagnosticStatus.OK, state
+            msg.status.append(DiagnosticStatus(
+                level=level, name=name, message=message,
+                values=[KeyValue(key='period', value=repr(period)),
+                        KeyValue(key='lag', value='%.6f' % lag)]))
+        self.pub_status.publish(msg)
+
+    def on_stalled(self, name, silence):
+        self.get_logger().error('%s missed its heartbeat for %.3f s' % (name, silence))
+
+    def on_recovered(self, name, silence):
+        self.get_logger().info('%s is beating again after %.3f s' % (name, silence))
+
+
+def main(args=None):
+    rclpy.init(args=args)
+
+    heartbeat_monitor = HeartbeatMonitor()
+
+    rclpy.spin(heartbeat_monitor)
+
+    rclpy.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import argparse
+from collections import defaultdict
+import fnmatch
+import sys
+
+from ros2_lifecycle_py.lifecycle_core import STATE_NAMES
+from ros2_lifecycle_py.lifecycle_core import TRANSITION_NAMES
+from ros2_lifecycle_py.lifecycle_core import TransitionId
+from ros2_lifecycle_py.lifecycle_recorder import numpy
+from ros2_lifecycle_py.lifecycle_recorder import read_node_names
+from ros2_lifecycle_py.lifecycle_recorder import read_segment
+from ros2_lifecycle_py.lifecycle_recorder import segment_paths
+
+
+# Result transitions are <transition>0 (success), <transition>1 (failure)
+# and <transition>2 (error), see lifecycle_msgs/msg/Transition.
+_FIRST_RESULT_TRANSITION = TransitionId.TRANSITION_ON_CONFIGURE_SUCCESS
+
+
+def load(directory):
+    # Returns (node names, records) with the records of all segments sorted
+    # by node and timestamp. With numpy the records are a structured array
+    # whose 'node' field indexes the node names, otherwise a list of
+    # (timestamp, node, transition, start, goal, duration) tuples. Records
+    # of node ids without a name (the .nodes file is lost or was not flushed
+    # yet) are skipped.
+    names = read_node_names(directory)
+    keys = sorted(names)
+    index = {key: i for i, key in enumerate(keys)}
+    node_names = [names[key] for key in keys]
+
+    if numpy is not None:
+        chunks = []
+        for run, path in segment_paths(directory):
+            records = read_segment(path)
+            lookup = numpy.full(int(records['node'].max(initial=0)) + 1, -1, dtype='<i8')
+            for (key_run, node_id), i in index.items():
+                if key_run == run and node_id < len(lookup):
+                    lookup[node_id] = i
+            node = lookup[records['node']]
+            records = records[node >= 0]
+            records['node'] = node[node >= 0]
+            chunks.append(records)
+        if not chunks:
+            return node_names, []
+        records = numpy.concatenate(chunks)
+        return node_names, records[numpy.lexsort((records['timestamp'], records['node']))]
+
+    records = []
+    for run, path in segment_paths(directory):
+        for timestamp, node, transition, start, goal, duration in read_segment(path):
+            node = index.get((run, node))
+            if node is not None:
+                records.append((timestamp, node, transition, start, goal, duration))
+    records.sort(key=lambda record: (record[1], record[0]))
+    return node_names, records
+
+
+def rows(records):
+    # (timestamp, node, transition, start, goal, duration) tuples
+    if numpy is not None and len(records):
+        return zip(*(records[field].tolist() for field in (
+            'timestamp', 'node', 'transition', 'start_state', 'goal_state', 'duration')))
+    return records
+
+
+def summarize(node_count, records):
+    # Per node: number of results, failures and errors and the nanoseconds
+    # spent in every state (up to the last event of the node).
+    if numpy is not None and len(records):
+        node = records['node'].astype('<i8')
+        transition = records['transition']
+        results = transition >= _FIRST_RESULT_TRANSITION
+        outcome = transition % 10
+
+        elapsed = numpy.diff(records['timestamp'])
+        same_node = node[1:] == node[:-1]
+        time_in_state = numpy.bincount(
+            (node[:-1] * 256 + records['goal_state'][:-1])[same_node],
+            weights=elapsed[same_node],
+            minlength=node_count * 256).reshape(node_count, 256)
+
+        return {
+            'results': numpy.bincount(node[results], minlength=node_count),
+            'failures': numpy.bincount(node[results & (outcome == 1)], minlength=node_count),
+            'errors': numpy.bincount(node[results & (outcome == 2)], minlength=node_count),
+            'time_in_state': [
+                {state: row[state] for state in numpy.flatnonzero(row)} for row in time_in_state
+            ],
+        }
+
+    summary = {
+        'results': [0] * node_count,
+        'failures': [0] * node_count,
+        'errors': [0] * node_count,
+        'time_in_state': [defaultdict(int) for _ in range(node_count)],
+    }
+    previous = None
+    for record in records:
+        timestamp, node, transition, _, goal, _ = record
+        if transition >= _FIRST_RESULT_TRANSITION:
+            summary['results'][node] += 1
+            if transition % 10 == 1:
+                summary['failures'][node] += 1
+            elif transition % 10 == 2:
+                summary['errors'][node] += 1
+        if previous is not None and previous[1] == node:
+            summary['time_in_state'][node][previous[4]] += timestamp - previous[0]
+        previous = record
+    return summary
+
+
+def print_timeline(node_names, records, selected):
+    for timestamp, node, transition, start, goal, duration in rows(records):
+        if node in selected:
+            print('%.9f %s %s: %s -> %s%s' % (
+                timestamp * 1e-9,
+                node_names[node],
+                TRANSITION_NAMES.get(transition, transition),
+                STATE_NAMES.get(start, start),
+                STATE_NAMES.get(goal, goal),
+                ' (%.3f ms)' % (duration * 1e-6) if duration else ''))
+
+
+def print_summary(node_names, summary, selected):
+    for node in sorted(selected, key=node_names.__getitem__):
+        results = summary['results'][node]
+        print('%s: %d transitions, %d failures, %d errors (%.2f%%)' % (
+            node_names[node], results, summary['failures'][node], summary['errors'][node],
+            100.0 * summary['errors'][node] / results if results else 0.0))
+        for state, elapsed in sorted(summary['time_in_state'][node].items()):
+            print('    %-40s %14.3f s' % (STATE_NAMES.get(state, state), elapsed * 1e-9))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Analyze the transition log written by a TransitionRecorder')
+    parser.add_argument('directory')
+    parser.add_argument(
+        '--node', default='*', help='fnmatch pattern of the fully qualified node names')
+    parser.add_argument(
+        '--timeline', action='store_true', help='print every transition event')
+    args = parser.parse_args(argv)
+
+    node_names, records = load(args.directory)
+    selected = {
+        node for node, name in enumerate(node_names) if fnmatch.fnmatchcase(name, args.node)
+    }
+
+    if args.timeline:
+        print_timeline(node_names, records, selected)
+    print_summary(node_names, summarize(len(node_names), records), selected)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import time
+
+import rclpy
+from rclpy.callback_groups import ReentrantCallbackGroup
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.node import Node
+
+from lifecycle_msgs.msg import Transition
+
+from std_srvs.srv import Trigger
+
+from ros2_lifecycle_py.lifecycle_client import LifecycleClient
+from ros2_lifecycle_py.lifecycle_tracing import Tracer
+
+
+STARTUP_TRANSITIONS = (
+    Transition.TRANSITION_CONFIGURE,
+    Transition.TRANSITION_ACTIVATE,
+)
+
+# Steps that do not apply to the current state of a node are rejected and
+# skipped, only the final shutdown decides the outcome. The managed nodes
+# resolve any of the shutdown ids to the one matching their current state.
+SHUTDOWN_TRANSITIONS = (
+    Transition.TRANSITION_DEACTIVATE,
+    Transition.TRANSITION_CLEANUP,
+    Transition.TRANSITION_UNCONFIGURED_SHUTDOWN,
+)
+
+
+def topological_waves(dependencies):
+    remaining = {name: set(deps) for name, deps in dependencies.items()}
+    for deps in list(remaining.values()):
+        for dep in deps:
+            remaining.setdefault(dep, set())
+
+    waves = []
+    while remaining:
+        wave = sorted(name for name, deps in remaining.items() if not deps)
+        if not wave:
+            raise ValueError('dependency cycle between ' + ', '.join(sorted(remaining)))
+        waves.append(wave)
+        for name in wave:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(wave)
+    return waves
+
+
+def parse_dependencies(node_names, dependencies):
+    # dependencies entries look like 'node: dep_a, dep_b'
+    graph = {name: set() for name in node_names}
+    for entry in dependencies:
+        name, _, deps = entry.partition(':')
+        graph.setdefault(name.strip(), set()).update(
+            dep.strip() for dep in deps.split(',') if dep.strip())
+    return graph
+
+
+class LifecycleManager(Node):
+
+    def __init__(self, node_name='lifecycle_manager', managed_nodes=None, tracer=None):
+        super().__init__(node_name)
+
+        self.declare_parameter('node_names', [''])
+        self.declare_parameter('dependencies', [''])
+        self.declare_parameter('autostart', False)
+        self.declare_parameter('service_timeout', 5.0)
+        self.declare_parameter('transition_timeout', 30.0)
+        self.declare_parameter('trace_file', '')
+
+        if managed_nodes is None:
+            managed_nodes = parse_dependencies(
+                [n for n in self.get_parameter('node_names').value if n],
+                [d for d in self.get_parameter('dependencies').value if d])
+        elif not isinstance(managed_nodes, dict):
+            managed_nodes = {name: () for name in managed_nodes}
+
+        self.waves = topological_waves(managed_nodes)
+        self.service_timeout = self.get_parameter('service_timeout').value
+        self.transition_timeout = self.get_parameter('transition_timeout').value
+
+        # With trace_file set, the spans of every startup/shutdown are written
+        # there as Chrome trace JSON once it completes.
+        self.trace_file = self.get_parameter('trace_file').value
+        if tracer is None and self.trace_file:
+            tracer = Tracer()
+        self.tracer = tracer
+
+        # Per node and total duration in seconds of the last startup/shutdown
+        # and the nodes that failed in it.
+        self.node_times = {}
+        self.total_time = None
+        self.failed_nodes = []
+
+        self.callback_group = ReentrantCallbackGroup()
+
+        self.lifecycle_client = LifecycleClient(
+            self, self.callback_group, self.service_timeout, self.transition_timeout,
+            self.tracer)
+
+        self.srv_startup = self.create_service(
+                Trigger,
+                node_name + '/startup',
+                self.startup_callback,
+                callback_group=self.callback_group
+            )
+
+        self.srv_shutdown = self.create_service(
+                Trigger,
+                node_name + '/shutdown',
+                self.shutdown_callback,
+                callback_group=self.callback_group
+            )
+
+        if self.get_parameter('autostart').value:
+            self.autostart_timer = self.create_timer(
+                0.0, self.autostart, callback_group=self.callback_group)
+
+    async def autostart(self):
+        self.destroy_timer(self.autostart_timer)
+        await self.startup()
+
+    async def startup_callback(self, request, response):
+        response.success = await self.startup()
+        response.message = self.summary()
+        return response
+
+    async def shutdown_callback(self, request, response):
+        response.success = await self.shutdown()
+        response.message = self.summary()
+        return response
+
+    async def startup(self):
+        return await self.run_waves(self.waves, STARTUP_TRANSITIONS, False)
+
+    async def shutdown(self):
+        return await self.run_waves(list(reversed(self.waves)), SHUTDOWN_TRANSITIONS, True)
+
+    async def run_waves(self, waves, transitions, best_effort):
+        # Startup stops at the first wave with a failed node. Shutdown is best
+        # effort and still runs all the remaining waves, the result tells
+        # whether every node made it.
+        self.node_times = {}
+        self.failed_nodes = []
+        start = time.monotonic()
+        success = True
+        for index, wave in enumerate(waves):
+            wave_start = time.monotonic()
+            tasks = [
+                self.executor.create_task(self.drive_node, name, transitions, best_effort)
+                for name in wave
+            ]
+            for name, task in zip(wave, tasks):
+                if not await task:
+                    success = False
+                    self.failed_nodes.append(name)
+                    if best_effort:
+                        self.get_logger().error(
+                            '%s failed, continuing with the remaining waves' % name)
+            if self.tracer is not None:
+                self.tracer.record(
+                    self.tracer.track(self.get_fully_qualified_name()),
+                    'wave %d' % index, wave_start, nodes=wave)
+            if not success and not best_effort:
+                break
+        self.total_time = time.monotonic() - start
+
+        if self.tracer is not None and self.trace_file:
+            self.tracer.dump(self.trace_file)
+
+        self.get_logger().info(self.summary())
+        return success
+
+    async def drive_node(self, name, transitions, best_effort=False):
+        start = time.monotonic()
+        try:
+            for transition_id in transitions:
+                success = await self.lifecycle_client.change_state(name, transition_id)
+                if not success and not best_effort:
+                    self.get_logger().error(
+                        'transition %d of %s failed' % (transition_id, name))
+                    return False
+            return success
+        finally:
+            self.node_times[name] = time.monotonic() - start
+
+    def summary(self):
+        if self.total_time is None:
+            return 'no transitions run yet'
+        per_node = ', '.join(
+            '%s %.3f s' % (name, duration) for name, duration in sorted(self.node_times.items()))
+        summary = 'total %.3f s (%s)' % (self.total_time, per_node)
+        if self.failed_nodes:
+            summary += ', failed: ' + ', '.join(self.failed_nodes)
+        return summary
+
+
+def main(args=None):
+    rclpy.init(args=args)
+
+    lifecycle_manager = LifecycleManager()
+
+    rclpy.spin(lifecycle_manager, executor=MultiThreadedExecutor())
+
+    rclpy.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import glob
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:  # the analyzer falls back to struct.iter_unpack
+    numpy = None
+
+
+# timestamp [ns], node id, transition, start state, goal state, padding,
+# callback duration [ns]
+RECORD = struct.Struct('<qIBBBxq')
+# magic, record size, padding to one record
+SEGMENT_HEADER = struct.Struct('<8sI12x')
+SEGMENT_MAGIC = b'LCYCLOG1'
+
+if numpy is not None:
+    RECORD_DTYPE = numpy.dtype([
+        ('timestamp', '<i8'),
+        ('node', '<u4'),
+        ('transition', 'u1'),
+        ('start_state', 'u1'),
+        ('goal_state', 'u1'),
+        ('padding', 'u1'),
+        ('duration', '<i8'),
+    ])
+
+_SEGMENT_NAME = re.compile(r'transitions_((\d+)-(\d+))_(\d+)\.lclog$')
+
+
+class TransitionRecorder:
+    # Append-only log of every transition event of the nodes sharing this
+    # recorder. Records are written into preallocated, memory-mapped segment
+    # files of segment_size bytes; a full segment is closed and the next one
+    # started, keeping at most max_segments of them per run. Unused trailing
+    # records are all zero. Node ids map to names through the
+    # transitions_<run>.nodes file next to the segments.
+    #
+    # A run is <start time [ns]>-<pid>: pids repeat across restarts (always
+    # 1 in a container), the log of the previous run must survive them. The
+    # files are created exclusively, nothing written before is ever opened
+    # for writing again.
+
+    def __init__(self, directory, segment_size=16 * 1024 * 1024, max_segments=None):
+        self.directory = directory
+        self.records_per_segment = max((segment_size - SEGMENT_HEADER.size) // RECORD.size, 1)
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        self.node_ids = {}
+
+        os.makedirs(directory, exist_ok=True)
+        while True:
+            self.run = '%d-%d' % (time.time_ns(), os.getpid())
+            try:
+                self.nodes_file = open(
+                    os.path.join(directory, 'transitions_%s.nodes' % self.run), 'x',
+                    buffering=1)
+            except FileExistsError:
+                continue
+            break
+
+        self.segment_index = -1
+        self.segment_file = None
+        self.mapping = None
+        self.offset = 0
+        self.open_segment()
+
+    def segment_path(self, index):
+        return os.path.join(self.directory, 'transitions_%s_%06d.lclog' % (self.run, index))
+
+    def open_segment(self):
+        self.close_segment()
+        self.segment_index += 1
+
+        size = SEGMENT_HEADER.size + self.records_per_segment * RECORD.size
+        self.segment_file = open(self.segment_path(self.segment_index), 'x+b')
+        self.segment_file.truncate(size)
+        self.mapping = mmap.mmap(self.segment_file.fileno(), size)
+        SEGMENT_HEADER.pack_into(self.mapping, 0, SEGMENT_MAGIC, RECORD.size)
+        self.offset = SEGMENT_HEADER.size
+
+        if self.max_segments is not None and self.segment_index >= self.max_segments:
+            try:
+                os.unlink(self.segment_path(self.segment_index - self.max_segments))
+            except FileNotFoundError:
+                pass
+
+    def close_segment(self):
+        if self.mapping is not None:
+            self.mapping.flush()
+            self.mapping.close()
+            self.mapping = None
+        if self.segment_file is not None:
+            self.segment_file.close()
+            self.segment_file = None
+
+    def register_node(self, name):
+        with self.lock:
+            node_id = self.node_ids.get(name)
+            if node_id is None:
+                node_id = self.node_ids[name] = len(self.node_ids)
+                self.nodes_file.write('%d\t%s\n' % (node_id, name))
+            return node_id
+
+    def record(self, timestamp, node_id, transition, start_state, goal_state, duration=0):
+        with self.lock:
+            if self.offset + RECORD.size > len(self.mapping):
+                self.open_segment()
+            RECORD.pack_into(
+                self.mapping, self.offset,
+                timestamp, node_id, transition, start_state, goal_state, duration)
+            self.offset += RECORD.size
+
+    def close(self):
+        with self.lock:
+            self.close_segment()
+            self.nodes_file.close()
+
+
+def read_node_names(directory):
+    # {(run, node id): name} for every run that wrote to directory
+    names = {}
+    for path in glob.glob(os.path.join(directory, 'transitions_*.nodes')):
+        run = os.path.basename(path)[len('transitions_'):-len('.nodes')]
+        with open(path) as f:
+            for line in f:
+                node_id, _, name = line.rstrip('\n').partition('\t')
+                names[(run, int(node_id))] = name
+    return names
+
+
+def segment_paths(directory):
+    # [(run, path)] in write order
+    segments = []
+    for path in glob.glob(os.path.join(directory, 'transitions_*_*.lclog')):
+        match = _SEGMENT_NAME.search(path)
+        if match:
+            run, started, pid, index = match.groups()
+            segments.append(((int(started), int(pid), int(index)), run, path))
+    return [(run, path) for _, run, path in sorted(segments)]
+
+
+def _check_header(data, path):
+    magic, record_size = SEGMENT_HEADER.unpack_from(data)
+    if magic != SEGMENT_MAGIC or record_size != RECORD.size:
+        raise ValueError('%s is not a transition log segment' % path)
+
+
+def read_segment(path):
+    # numpy structured array of the used records of one segment, or a list
+    # of RECORD tuples when numpy is not available.
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            _check_header(mapping, path)
+            if numpy is not None:
+                records = numpy.frombuffer(
+                    mapping, dtype=RECORD_DTYPE, offset=SEGMENT_HEADER.size).copy()
+                return records[records['timestamp'] != 0]
+            return [
+                record for record in RECORD.iter_unpack(mapping[SEGMENT_HEADER.size:])
+                if record[0] != 0
+            ]
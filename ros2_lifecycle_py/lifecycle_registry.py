@@ -0,0 +1,124 @@
+from fnmatch import fnmatchcase
+import time
+
+from rclpy.callback_groups import ReentrantCallbackGroup
+from rclpy.node import Node
+from rclpy.qos import DurabilityPolicy
+from rclpy.qos import QoSProfile
+
+from diagnostic_msgs.msg import DiagnosticArray
+from diagnostic_msgs.msg import DiagnosticStatus
+from diagnostic_msgs.msg import KeyValue
+
+from lifecycle_msgs.msg import State
+from lifecycle_msgs.msg import Transition
+from lifecycle_msgs.srv import ChangeState
+
+
+class LifecycleRegistry(Node):
+    # One registry per process serves every LifecycleNode constructed with
+    # registry=... through a single set of entities:
+    #   <registry>/change_state       ChangeState, transition.label holds a
+    #                                 node name pattern ('' addresses all)
+    #   <registry>/transition_events  DiagnosticArray, one status per event
+    #   <registry>/states             DiagnosticArray, latched snapshot of
+    #                                 the current state of every node
+    # Registered nodes start without parameter services. Constructed with
+    # enable_communication_interface=False and enable_rosout=False, a node
+    # is left with the parameter_events publisher rclpy always creates.
+
+    def __init__(self, node_name='lifecycle_registry', states_period=0.1):
+        super().__init__(node_name)
+
+        self.nodes = {}
+        self.states_dirty = False
+
+        self.callback_group = ReentrantCallbackGroup()
+
+        self.srv_change_state = self.create_service(
+                ChangeState,
+                node_name + '/change_state',
+                self.change_state,
+                callback_group=self.callback_group
+            )
+
+        self.pub_transition_events = self.create_publisher(
+                DiagnosticArray,
+                node_name + '/transition_events',
+                10
+            )
+
+        self.pub_states = self.create_publisher(
+                DiagnosticArray,
+                node_name + '/states',
+                QoSProfile(depth=1, durability=DurabilityPolicy.TRANSIENT_LOCAL)
+            )
+
+        self.states_timer = self.create_timer(
+            states_period, self.publish_states, callback_group=self.callback_group)
+
+    def register(self, node):
+        self.nodes[node.get_fully_qualified_name()] = node
+        self.states_dirty = True
+
+    def unregister(self, node):
+        self.nodes.pop(node.get_fully_qualified_name(), None)
+        self.states_dirty = True
+
+    def match(self, pattern=None):
+        if not pattern:
+            return list(self.nodes.items())
+        return [(name, node) for name, node in self.nodes.items() if fnmatchcase(name, pattern)]
+
+    def get_states(self, pattern=None):
+        return {name: node.state for name, node in self.match(pattern)}
+
+    async def change_state_many(self, transition_id, pattern=None):
+        requested_at = time.monotonic()
+        tasks = {
+            name: self.executor.create_task(node.apply_transition, transition_id, requested_at)
+            for name, node in self.match(pattern)
+        }
+        results = {}
+        for name, task in tasks.items():
+            results[name] = (await task == Transition.TRANSITION_CALLBACK_SUCCESS)
+        return results
+
+    async def change_state(self, request, response):
+        results = await self.change_state_many(
+            request.transition.id, request.transition.label)
+        response.success = bool(results) and all(results.values())
+        return response
+
+    def notify_transition(self, node, event):
+        self.states_dirty = True
+        msg = DiagnosticArray(status=[
+            DiagnosticStatus(
+                level=DiagnosticStatus.OK,
+                name=node.get_fully_qualified_name(),
+                message=event.goal_state.label,
+                values=[
+                    KeyValue(key='timestamp', value=str(event.timestamp)),
+                    KeyValue(key='transition', value=str(event.transition.id)),
+                    KeyValue(key='start_state', value=str(event.start_state.id)),
+                    KeyValue(key='goal_state', value=str(event.goal_state.id)),
+                ])
+        ])
+        msg.header.stamp = self.get_clock().now().to_msg()
+        self.pub_transition_events.publish(msg)
+
+    def publish_states(self):
+        if not self.states_dirty:
+            return
+        self.states_dirty = False
+
+        msg = DiagnosticArray(status=[
+            DiagnosticStatus(
+                level=DiagnosticStatus.OK,
+                name=name,
+                message=node.get_label(State, node.state),
+                values=[KeyValue(key='state', value=str(node.state))])
+            for name, node in self.nodes.items()
+        ])
+        msg.header.stamp = self.get_clock().now().to_msg()
+        self.pub_states.publish(msg)
@@ -0,0 +1,239 @@
+import json
+import time
+
+import rclpy
+from rclpy.callback_groups import ReentrantCallbackGroup
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.node import Node
+from rclpy.qos import DurabilityPolicy
+from rclpy.qos import QoSProfile
+
+from lifecycle_msgs.msg import State
+from lifecycle_msgs.msg import Transition
+from lifecycle_msgs.msg import TransitionEvent
+
+from std_msgs.msg import String
+from std_srvs.srv import Trigger
+
+from ros2_lifecycle_py.lifecycle import async_sleep
+from ros2_lifecycle_py.lifecycle_client import LifecycleClient
+
+
+_MIRROR_QOS = QoSProfile(depth=1, durability=DurabilityPolicy.TRANSIENT_LOCAL)
+
+# Events of the primary after which the standby takes over: entering error
+# processing, or finalized by a failed error processing. A requested shutdown
+# also ends in FINALIZED but is not a failure.
+_FAILED_TRANSITIONS = (
+    Transition.TRANSITION_ON_ERROR_FAILURE,
+    Transition.TRANSITION_ON_ERROR_ERROR,
+)
+
+
+def _is_failure(event):
+    return (event.goal_state.id == State.TRANSITION_STATE_ERRORPROCESSING
+            or event.transition.id in _FAILED_TRANSITIONS)
+
+
+class StateMirror:
+    # Lightweight state shared between the nodes of a pair as JSON on a
+    # latched topic. Roles swap on switchover, so every node has both ends:
+    # publish() only goes out while the node is active (lifecycle
+    # publisher), on_state is called with the updates of the active node
+    # while this one is not.
+
+    def __init__(self, node, topic, on_state):
+        self.node = node
+        self.on_state = on_state
+        self.publisher = node.create_lifecycle_publisher(String, topic, _MIRROR_QOS)
+        self.subscription = node.create_subscription(
+            String, topic, self.mirror_callback, _MIRROR_QOS)
+
+    def mirror_callback(self, msg):
+        if self.node.state != State.PRIMARY_STATE_ACTIVE:
+            self.on_state(json.loads(msg.data))
+
+    def publish(self, state):
+        self.publisher.publish(lambda: String(data=json.dumps(state)))
+
+
+class HotStandbyPair(Node):
+    # Keeps `primary` active and `standby` configured (inactive) and swaps
+    # their roles with deactivate-primary / activate-standby, either on the
+    # <name>/switchover service or automatically when the primary fails.
+    #
+    # A primary failing a transition announces it with a transition event. A
+    # crashed or hung one publishes nothing, so once the pair is up the
+    # primary is also polled with get_state every health_check_period: no
+    # answer within health_check_timeout for health_check_misses polls in a
+    # row, or an answer in error processing, is a failure as well.
+
+    def __init__(self, node_name='hot_standby', primary=None, standby=None):
+        super().__init__(node_name)
+
+        self.declare_parameter('primary', primary or '')
+        self.declare_parameter('standby', standby or '')
+        self.declare_parameter('auto_failover', True)
+        self.declare_parameter('service_timeout', 5.0)
+        self.declare_parameter('transition_timeout', 10.0)
+        self.declare_parameter('deactivate_timeout', 0.5)
+        self.declare_parameter('health_check_period', 0.5)
+        self.declare_parameter('health_check_timeout', 0.5)
+        self.declare_parameter('health_check_misses', 2)
+        self.declare_parameter('warm_up_retry_period', 1.0)
+
+        self.primary = self.get_parameter('primary').value
+        self.standby = self.get_parameter('standby').value
+        self.auto_failover = self.get_parameter('auto_failover').value
+        self.service_timeout = self.get_parameter('service_timeout').value
+        self.transition_timeout = self.get_parameter('transition_timeout').value
+        self.deactivate_timeout = self.get_parameter('deactivate_timeout').value
+        self.health_check_period = self.get_parameter('health_check_period').value
+        self.health_check_timeout = self.get_parameter('health_check_timeout').value
+        self.health_check_misses = self.get_parameter('health_check_misses').value
+        self.warm_up_retry_period = self.get_parameter('warm_up_retry_period').value
+
+        # Seconds from the switchover request until the standby is active.
+        self.switchover_latencies = []
+        self.switching = False
+        self.checking = False
+        self.missed_checks = 0
+        self.health_timer = None
+        # Failed primaries being brought back as warm standby.
+        self.warming_up = set()
+
+        self.callback_group = ReentrantCallbackGroup()
+
+        self.lifecycle_client = LifecycleClient(
+            self, self.callback_group, self.service_timeout, self.transition_timeout)
+
+        for name in (self.primary, self.standby):
+            self.create_subscription(
+                TransitionEvent,
+                name + '/transition_event',
+                lambda event, name=name: self.transition_event_callback(name, event),
+                10,
+                callback_group=self.callback_group)
+
+        self.srv_switchover = self.create_service(
+                Trigger,
+                node_name + '/switchover',
+                self.switchover_callback,
+                callback_group=self.callback_group
+            )
+
+        self.prepare_timer = self.create_timer(
+            0.0, self.prepare, callback_group=self.callback_group)
+
+    async def prepare(self):
+        self.destroy_timer(self.prepare_timer)
+        change_state = self.lifecycle_client.change_state
+        await change_state(self.primary, Transition.TRANSITION_CONFIGURE)
+        await change_state(self.primary, Transition.TRANSITION_ACTIVATE)
+        await change_state(self.standby, Transition.TRANSITION_CONFIGURE)
+
+        if self.auto_failover and self.health_check_period > 0.0:
+            self.health_timer = self.create_timer(
+                self.health_check_period, self.check_primary,
+                callback_group=self.callback_group)
+
+    async def switchover_callback(self, request, response):
+        response.success = await self.switchover()
+        if self.switchover_latencies:
+            response.message = 'primary %s, switchover %.3f ms' % (
+                self.primary, self.switchover_latencies[-1] * 1e3)
+        return response
+
+    def transition_event_callback(self, name, event):
+        if self.auto_failover and name == self.primary and _is_failure(event):
+            self.get_logger().warn('primary %s failed, switching over' % name)
+            self.executor.create_task(self.switchover)
+
+    async def check_primary(self):
+        if self.checking or self.switching:
+            return
+        self.checking = True
+        try:
+            primary = self.primary
+            state = await self.lifecycle_client.get_state(primary, self.health_check_timeout)
+        finally:
+            self.checking = False
+        if primary != self.primary or self.switching:
+            return
+
+        if state is None:
+            self.missed_checks += 1
+            if self.missed_checks < self.health_check_misses:
+                return
+            self.get_logger().warn('primary %s did not answer %d health checks, switching over'
+                                   % (primary, self.missed_checks))
+        elif state == State.TRANSITION_STATE_ERRORPROCESSING:
+            self.get_logger().warn('primary %s is in error processing, switching over' % primary)
+        else:
+            self.missed_checks = 0
+            return
+        await self.switchover()
+
+    async def switchover(self):
+        if self.switching:
+            return False
+        self.switching = True
+        try:
+            start = time.monotonic()
+
+            # The primary may be dead or wedged, it only gets a short deadline
+            # to deactivate before the standby is activated regardless.
+            deactivated = await self.lifecycle_client.change_state(
+                self.primary, Transition.TRANSITION_DEACTIVATE, self.deactivate_timeout)
+            if not await self.lifecycle_client.change_state(
+                    self.standby, Transition.TRANSITION_ACTIVATE):
+                self.get_logger().error('standby %s failed to activate' % self.standby)
+                return False
+
+            latency = time.monotonic() - start
+            self.switchover_latencies.append(latency)
+            self.get_logger().info('switched over from %s to %s in %.3f ms' % (
+                self.primary, self.standby, latency * 1e3))
+            self.primary, self.standby = self.standby, self.primary
+            self.missed_checks = 0
+            if not deactivated:
+                self.executor.create_task(self.warm_up, self.standby)
+            return True
+        finally:
+            self.switching = False
+
+    async def warm_up(self, name):
+        # The failed primary may still be in error processing, restarting or
+        # gone for good. It is driven to inactive until that succeeds or it
+        # is not the standby any more.
+        if name in self.warming_up:
+            return
+        self.warming_up.add(name)
+        try:
+            while name == self.standby:
+                if await self.lifecycle_client.change_state_to(
+                        name, State.PRIMARY_STATE_INACTIVE):
+                    self.get_logger().info('%s is the warm standby again' % name)
+                    return
+                await async_sleep(self, self.warm_up_retry_period, self.callback_group)
+        finally:
+            self.warming_up.discard(name)
+        self.checking = False
+        self.missed_checks = 0
+        self.health_timer = None
+        # Failed primaries being brought back as warm standby.
+        self.warming_up = set()
+
+
+def main(args=None):
+    rclpy.init(args=args)
+
+    hot_standby = HotStandbyPair()
+
+    rclpy.spin(hot_standby, executor=MultiThreadedExecutor())
+
+    rclpy.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+from array import array
+
+from diagnostic_msgs.msg import DiagnosticStatus
+from diagnostic_msgs.msg import KeyValue
+
+from lifecycle_msgs.msg import Transition
+
+
+class DurationWindow:
+    # Fixed size ring of the most recent durations in seconds, percentiles
+    # are computed over this window, the maximum over the whole lifetime.
+
+    def __init__(self, size):
+        self.samples = array('d', bytes(8 * size))
+        self.size = size
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, duration):
+        self.samples[self.count % self.size] = duration
+        self.count += 1
+        if duration > self.max:
+            self.max = duration
+
+    def percentile(self, q):
+        samples = sorted(self.samples[:min(self.count, self.size)])
+        if not samples:
+            return 0.0
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class TransitionStatistics:
+
+    def __init__(self, window=256):
+        self.count = 0
+        self.failures = 0
+        self.errors = 0
+        self.duration = DurationWindow(window)
+        self.callback_duration = DurationWindow(window)
+        self.queued = DurationWindow(window)
+
+    def record(self, result, duration, callback_duration, queued):
+        self.count += 1
+        if result == Transition.TRANSITION_CALLBACK_FAILURE:
+            self.failures += 1
+        elif result != Transition.TRANSITION_CALLBACK_SUCCESS:
+            self.errors += 1
+        self.duration.add(duration)
+        self.callback_duration.add(callback_duration)
+        # Only transitions whose request waited in a queue (go_to_state(),
+        # registry, ...) have a queued time.
+        if queued is not None:
+            self.queued.add(queued)
+
+    def as_dict(self):
+        stats = {'count': self.count, 'failures': self.failures, 'errors': self.errors,
+                 'queued_count': self.queued.count}
+        for name, window in (('duration', self.duration),
+                             ('callback', self.callback_duration),
+                             ('queued', self.queued)):
+            stats[name + '_p50'] = window.percentile(0.50)
+            stats[name + '_p95'] = window.percentile(0.95)
+            stats[name + '_p99'] = window.percentile(0.99)
+            stats[name + '_max'] = window.max
+        return stats
+
+    def to_status(self, name):
+        return DiagnosticStatus(
+            level=DiagnosticStatus.OK if not self.errors else DiagnosticStatus.WARN,
+            name=name,
+            message='%d transitions, %d failures, %d errors' % (
+                self.count, self.failures, self.errors),
+            values=[KeyValue(key=key, value=str(value)) for key, value in self.as_dict().items()])
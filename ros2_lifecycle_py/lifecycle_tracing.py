@@ -0,0 +1,73 @@
+from collections import deque
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    # In-memory buffer of the last `capacity` spans, dumped as Chrome
+    # trace-event JSON (chrome://tracing, Perfetto). Every track (usually a
+    # node name) becomes one timeline row. Times are time.monotonic()
+    # seconds, the clock the lifecycle code measures with, so traces of
+    # several processes on one host line up.
+    #
+    # Components take tracer=None and skip all tracing code when it is
+    # None, so a disabled tracer costs one attribute test per hook.
+
+    def __init__(self, capacity=65536):
+        self.spans = deque(maxlen=capacity)
+        self.tracks = {}
+        self.lock = threading.Lock()
+
+    def track(self, name):
+        track = self.tracks.get(name)
+        if track is None:
+            with self.lock:
+                track = self.tracks.setdefault(name, len(self.tracks) + 1)
+        return track
+
+    def record(self, track, name, begin, end=None, **args):
+        # deque.append is atomic, spans may be recorded from any thread.
+        if end is None:
+            end = time.monotonic()
+        self.spans.append((track, name, begin, end, threading.get_ident(), args))
+
+    def wrap(self, track, name, fn):
+        # fn recording a span on whatever thread it is called on.
+        def traced(*args, **kwargs):
+            begin = time.monotonic()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(track, name, begin)
+
+        return traced
+
+    def clear(self):
+        self.spans.clear()
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        names = {track: name for name, track in self.tracks.items()}
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': track,
+             'args': {'name': name}}
+            for track, name in names.items()
+        ]
+        for track, name, begin, end, thread, args in list(self.spans):
+            events.append({
+                'name': name,
+                'cat': 'lifecycle',
+                'ph': 'X',
+                'ts': begin * 1e6,
+                'dur': (end - begin) * 1e6,
+                'pid': pid,
+                'tid': track,
+                'args': dict(args, thread=thread),
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
@@ -0,0 +1,142 @@
+import copy
+
+from rclpy.qos import HistoryPolicy
+from rclpy.serialization import deserialize_message
+
+
+class ManagedEntity:
+    # Entity whose behaviour is switched by the activate/deactivate
+    # transitions of the LifecycleNode owning it.
+
+    def __init__(self, active=False):
+        self.active = active
+
+    @property
+    def is_activated(self):
+        return self.active
+
+    def on_activate(self):
+        self.active = True
+
+    def on_deactivate(self):
+        self.active = False
+
+    def destroy(self):
+        # The wrapped publisher/timer is destroyed by the node.
+        pass
+
+
+class LifecyclePublisher(ManagedEntity):
+
+    def __init__(self, publisher, active=False):
+        super().__init__(active)
+        self.publisher = publisher
+
+    def publish(self, msg):
+        # msg may be a callable building the message, it is only invoked
+        # while the publisher is active.
+        if not self.active:
+            return
+        if callable(msg):
+            msg = msg()
+        self.publisher.publish(msg)
+
+    def __getattr__(self, name):
+        return getattr(self.publisher, name)
+
+
+class LifecycleTimer(ManagedEntity):
+
+    def __init__(self, timer, active=False):
+        super().__init__(active)
+        self.timer = timer
+        if not active:
+            timer.cancel()
+
+    def on_activate(self):
+        super().on_activate()
+        self.timer.reset()
+
+    def on_deactivate(self):
+        super().on_deactivate()
+        self.timer.cancel()
+
+    def __getattr__(self, name):
+        return getattr(self.timer, name)
+
+
+class LifecycleSubscription(ManagedEntity):
+    # Subscription that receives nothing while inactive. By default the
+    # reader only exists while active: it is destroyed on deactivate and
+    # created again on activate, so paused nodes cost no network traffic,
+    # but the reader has to be matched by the publishers again. With raw
+    # the reader is kept and takes serialized messages, only deserialized
+    # while active and otherwise dropped as bytes.
+    #
+    # latest_only delivers just the newest sample on activate: raw readers
+    # keep the last dropped message and hand it over, re-created readers get
+    # a history depth of 1, i.e. at most the last sample a transient local
+    # publisher still holds.
+
+    def __init__(self, node, msg_type, topic, callback, qos_profile, raw=False,
+                 latest_only=False, active=False, **kwargs):
+        super().__init__(active)
+        self.node = node
+        self.msg_type = msg_type
+        self.topic = topic
+        self.callback = callback
+        self.raw = raw
+        self.latest_only = latest_only
+        self.kwargs = kwargs
+        self.latest = None
+        self.subscription = None
+
+        if latest_only and not raw:
+            if isinstance(qos_profile, int):
+                qos_profile = 1
+            else:
+                qos_profile = copy.copy(qos_profile)
+                qos_profile.history = HistoryPolicy.KEEP_LAST
+                qos_profile.depth = 1
+        self.qos_profile = qos_profile
+
+        if raw or active:
+            self.create_subscription()
+
+    def create_subscription(self):
+        if self.raw:
+            self.subscription = self.node.create_subscription(
+                self.msg_type, self.topic, self.receive, self.qos_profile, raw=True,
+                **self.kwargs)
+        else:
+            self.subscription = self.node.create_subscription(
+                self.msg_type, self.topic, self.callback, self.qos_profile, **self.kwargs)
+
+    def receive(self, data):
+        if self.active:
+            return self.callback(deserialize_message(data, self.msg_type))
+        if self.latest_only:
+            self.latest = data
+
+    def on_activate(self):
+        super().on_activate()
+        if not self.raw:
+            self.create_subscription()
+        elif self.latest is not None:
+            # Delivered by the executor like any other message, not from
+            # inside the transition.
+            data, self.latest = self.latest, None
+            self.node.executor.create_task(self.receive, data)
+
+    def on_deactivate(self):
+        super().on_deactivate()
+        if not self.raw:
+            self.destroy()
+
+    def destroy(self):
+        if self.subscription is not None:
+            self.node.destroy_subscription(self.subscription)
+            self.subscription = None
+
+    def __getattr__(self, name):
+        return getattr(self.subscription, name)
@@ -21,6 +21,11 @@ setup(
     entry_points={
         'console_scripts': [
           'demo_talker = ros2_lifecycle_py.lifecycle_talker:main', 
+          'lifecycle_manager = ros2_lifecycle_py.lifecycle_manager:main',
+          'hot_standby = ros2_lifecycle_py.lifecycle_standby:main',
+          'lifecycle_log_analyzer = ros2_lifecycle_py.lifecycle_log_analyzer:main',
+          'ros2_lifecycle_py = ros2_lifecycle_py.lifecycle_cli:main',
+          'heartbeat_monitor = ros2_lifecycle_py.lifecycle_heartbeat:main',
         ],
     },
 )
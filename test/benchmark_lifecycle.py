@@ -0,0 +1,232 @@
+# Benchmarks for ros2_lifecycle_py against the local rclpy installation.
+#
+#   python3 test/benchmark_lifecycle.py --output results.json
+#   python3 test/benchmark_lifecycle.py --compare results.json
+#
+# Results are written as JSON so runs of different versions can be diffed.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import rclpy
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.executors import SingleThreadedExecutor
+from rclpy.node import Node
+
+from lifecycle_msgs.msg import State
+from lifecycle_msgs.msg import Transition
+from lifecycle_msgs.srv import ChangeState
+from lifecycle_msgs.srv import GetState
+
+from ros2_lifecycle_py.lifecycle import LifecycleNode
+
+
+EXECUTORS = {
+    'single_threaded': SingleThreadedExecutor,
+    'multi_threaded': MultiThreadedExecutor,
+}
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'n': len(samples),
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'p50_us': samples[len(samples) // 2] * 1e6,
+        'p95_us': samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1e6,
+        'p99_us': samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1e6,
+        'max_us': samples[-1] * 1e6,
+    }
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def call(executor, client, request, timeout=10.0):
+    future = client.call_async(request)
+    executor.spin_until_future_complete(future, timeout_sec=timeout)
+    if not future.done():
+        raise RuntimeError('%s timed out' % client.srv_name)
+    return future.result()
+
+
+def wait_for_services(executor, clients, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not all(client.service_is_ready() for client in clients):
+        if time.monotonic() > deadline:
+            raise RuntimeError('services not discovered within %.1f s' % timeout)
+        executor.spin_once(timeout_sec=0.01)
+
+
+def bench_round_trip(iterations):
+    executor = SingleThreadedExecutor()
+    target = LifecycleNode('bench_target')
+    driver = Node('bench_driver')
+    executor.add_node(target)
+    executor.add_node(driver)
+
+    change_state = driver.create_client(ChangeState, 'bench_target/change_state')
+    get_state = driver.create_client(GetState, 'bench_target/get_state')
+    wait_for_services(executor, [change_state, get_state])
+
+    transitions = (Transition.TRANSITION_CONFIGURE, Transition.TRANSITION_CLEANUP)
+    change_samples = []
+    get_samples = []
+    for i in range(iterations):
+        request = ChangeState.Request(transition=Transition(id=transitions[i % 2]))
+        start = time.perf_counter()
+        if not call(executor, change_state, request).success:
+            raise RuntimeError('change_state failed')
+        change_samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        call(executor, get_state, GetState.Request())
+        get_samples.append(time.perf_counter() - start)
+
+    executor.shutdown()
+    target.destroy_node()
+    driver.destroy_node()
+    return {'change_state': summarize(change_samples), 'get_state': summarize(get_samples)}
+
+
+def bench_construction(count):
+    gc.collect()
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    samples = []
+    nodes = []
+    for i in range(count):
+        start = time.perf_counter()
+        nodes.append(LifecycleNode('bench_construct_%d' % i))
+        samples.append(time.perf_counter() - start)
+    python_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = rss_bytes()
+
+    for node in nodes:
+        node.destroy_node()
+    return {
+        'construction': summarize(samples),
+        'python_bytes_per_node': python_bytes / count,
+        'rss_bytes_per_node': (rss_after - rss_before) / count,
+    }
+
+
+def bench_publish_event(iterations):
+    node = LifecycleNode('bench_publish')
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        node.publish_transition_event(
+            Transition.TRANSITION_ACTIVATE,
+            State.PRIMARY_STATE_INACTIVE,
+            State.TRANSITION_STATE_ACTIVATING)
+        samples.append(time.perf_counter() - start)
+    node.destroy_node()
+    return summarize(samples)
+
+
+def bench_bring_up(count, executor_name):
+    executor = EXECUTORS[executor_name]()
+    nodes = [LifecycleNode('bench_fleet_%d' % i) for i in range(count)]
+    driver = Node('bench_fleet_driver')
+    for node in nodes:
+        executor.add_node(node)
+    executor.add_node(driver)
+
+    clients = [
+        driver.create_client(ChangeState, node.get_name() + '/change_state') for node in nodes
+    ]
+    discovery_start = time.perf_counter()
+    wait_for_services(executor, clients, timeout=max(10.0, count * 0.05))
+    discovery = time.perf_counter() - discovery_start
+
+    start = time.perf_counter()
+    for transition_id in (Transition.TRANSITION_CONFIGURE, Transition.TRANSITION_ACTIVATE):
+        futures = [
+            client.call_async(ChangeState.Request(transition=Transition(id=transition_id)))
+            for client in clients
+        ]
+        for future in futures:
+            executor.spin_until_future_complete(future, timeout_sec=60.0)
+            if not future.done() or not future.result().success:
+                raise RuntimeError('bring-up of %d nodes failed' % count)
+    bring_up = time.perf_counter() - start
+
+    if any(node.state != State.PRIMARY_STATE_ACTIVE for node in nodes):
+        raise RuntimeError('not every node reached PRIMARY_STATE_ACTIVE')
+
+    executor.shutdown()
+    for node in nodes:
+        node.destroy_node()
+    driver.destroy_node()
+    return {'discovery_s': discovery, 'bring_up_s': bring_up}
+
+
+def compare(baseline, results, path=()):
+    for key, value in results.items():
+        if key not in baseline or key == 'meta':
+            continue
+        if isinstance(value, dict):
+            compare(baseline[key], value, path + (key,))
+        elif isinstance(value, (int, float)) and baseline[key]:
+            print('%-60s %12.3f %12.3f %+7.1f%%' % (
+                '.'.join(path + (key,)), baseline[key], value,
+                (value - baseline[key]) / baseline[key] * 100.0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ros2_lifecycle_py benchmarks')
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--fleet-sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare against')
+    args = parser.parse_args(argv)
+
+    rclpy.init()
+    try:
+        results = {
+            'meta': {
+                'timestamp': time.time(),
+                'python': platform.python_version(),
+                'ros_distro': os.environ.get('ROS_DISTRO'),
+                'rmw_implementation': os.environ.get('RMW_IMPLEMENTATION'),
+                'iterations': args.iterations,
+            },
+            'round_trip': bench_round_trip(args.iterations),
+            'node': bench_construction(min(args.iterations, 200)),
+            'publish_transition_event': bench_publish_event(args.iterations),
+            'bring_up': {
+                executor_name: {
+                    str(count): bench_bring_up(count, executor_name)
+                    for count in args.fleet_sizes
+                }
+                for executor_name in EXECUTORS
+            },
+        }
+    finally:
+        rclpy.shutdown()
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(json.load(baseline), results)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
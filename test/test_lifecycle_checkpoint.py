@@ -0,0 +1,92 @@
+import pytest
+
+from ros2_lifecycle_py.lifecycle_checkpoint import Checkpoint
+from ros2_lifecycle_py.lifecycle_core import StateId
+
+
+INACTIVE = StateId.PRIMARY_STATE_INACTIVE
+ACTIVE = StateId.PRIMARY_STATE_ACTIVE
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'node.ckpt'))
+    yield checkpoint
+    checkpoint.close()
+
+
+def test_load_without_checkpoint(checkpoint):
+    assert checkpoint.load() == (None, None)
+
+
+def test_save_and_load(checkpoint):
+    checkpoint.save(INACTIVE, b'configured resources')
+    state, snapshot = checkpoint.load()
+    assert state == INACTIVE
+    assert bytes(snapshot) == b'configured resources'
+    snapshot.release()
+
+
+def test_save_empty_snapshot(checkpoint):
+    checkpoint.save(INACTIVE)
+    state, snapshot = checkpoint.load()
+    assert state == INACTIVE
+    assert bytes(snapshot) == b''
+    snapshot.release()
+
+
+def test_save_state_keeps_snapshot(checkpoint):
+    checkpoint.save(INACTIVE, b'snapshot')
+    checkpoint.save_state(ACTIVE)
+    state, snapshot = checkpoint.load()
+    assert state == ACTIVE
+    assert bytes(snapshot) == b'snapshot'
+    snapshot.release()
+
+
+def test_save_replaces_a_loaded_checkpoint(checkpoint):
+    checkpoint.save(INACTIVE, b'first')
+    _, snapshot = checkpoint.load()
+    first = bytes(snapshot)
+    checkpoint.save(ACTIVE, b'second')
+    assert first == b'first'
+    assert bytes(snapshot) == b'first'
+    snapshot.release()
+    state, snapshot = checkpoint.load()
+    assert (state, bytes(snapshot)) == (ACTIVE, b'second')
+    snapshot.release()
+
+
+def test_clear(checkpoint):
+    checkpoint.save(INACTIVE, b'snapshot')
+    checkpoint.clear()
+    assert checkpoint.load() == (None, None)
+    checkpoint.clear()
+
+
+@pytest.mark.parametrize('content', [
+    b'',
+    b'LCYC',
+    b'NOTACKPT' + b'\0' * 12,
+])
+def test_invalid_checkpoint_is_ignored(checkpoint, content):
+    with open(checkpoint.path, 'wb') as f:
+        f.write(content)
+    assert checkpoint.load() == (None, None)
+
+
+def test_truncated_snapshot_is_ignored(checkpoint):
+    checkpoint.save(INACTIVE, b'configured resources')
+    with open(checkpoint.path, 'r+b') as f:
+        f.truncate(30)
+    assert checkpoint.load() == (None, None)
+
+
+@pytest.mark.parametrize('content', [b'', b'garbage', b'NOTACKPT\2\0\0\0'])
+def test_invalid_state_file_falls_back_to_snapshot_state(checkpoint, content):
+    checkpoint.save(INACTIVE, b'snapshot')
+    with open(checkpoint.state_path, 'wb') as f:
+        f.write(content)
+    state, snapshot = checkpoint.load()
+    assert state == INACTIVE
+    snapshot.release()
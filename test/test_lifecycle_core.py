@@ -0,0 +1,226 @@
+import asyncio
+
+import pytest
+
+from ros2_lifecycle_py.lifecycle_core import EventBus
+from ros2_lifecycle_py.lifecycle_core import LifecycleStateMachine
+from ros2_lifecycle_py.lifecycle_core import plan_transitions
+from ros2_lifecycle_py.lifecycle_core import run_sync
+from ros2_lifecycle_py.lifecycle_core import StateId
+from ros2_lifecycle_py.lifecycle_core import TransitionId
+
+
+SUCCESS = TransitionId.TRANSITION_CALLBACK_SUCCESS
+FAILURE = TransitionId.TRANSITION_CALLBACK_FAILURE
+ERROR = TransitionId.TRANSITION_CALLBACK_ERROR
+
+
+class Machine(LifecycleStateMachine):
+    # results: callback name ('configure', ...) -> return code, or an
+    # exception to raise. gate: callback name -> asyncio.Event awaited
+    # before returning.
+
+    def __init__(self, results=None, gate=None):
+        super().__init__(bus=EventBus(history=64))
+        self.results = results or {}
+        self.gate = gate or {}
+        self.calls = []
+        self.create()
+
+    async def callback(self, name):
+        self.calls.append(name)
+        if name in self.gate:
+            await self.gate[name].wait()
+        result = self.results.get(name, SUCCESS)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def on_configure(self):
+        return self.callback('configure')
+
+    def on_cleanup(self):
+        return self.callback('cleanup')
+
+    def on_activate(self):
+        return self.callback('activate')
+
+    def on_deactivate(self):
+        return self.callback('deactivate')
+
+    def on_shutdown(self):
+        return self.callback('shutdown')
+
+    def on_error(self):
+        return self.callback('error')
+
+
+def run(machine, transition_id):
+    return asyncio.run(machine.apply_transition(transition_id))
+
+
+def goal_states(machine):
+    return [event.goal_state for event in machine.bus.history]
+
+
+def test_create():
+    machine = Machine()
+    assert machine.state == StateId.PRIMARY_STATE_UNCONFIGURED
+    assert machine.create() == FAILURE
+
+
+@pytest.mark.parametrize('start_transitions, transition_id, goal_state', [
+    ((), TransitionId.TRANSITION_CONFIGURE, StateId.PRIMARY_STATE_INACTIVE),
+    ((TransitionId.TRANSITION_CONFIGURE,), TransitionId.TRANSITION_CLEANUP,
+        StateId.PRIMARY_STATE_UNCONFIGURED),
+    ((TransitionId.TRANSITION_CONFIGURE,), TransitionId.TRANSITION_ACTIVATE,
+        StateId.PRIMARY_STATE_ACTIVE),
+    ((TransitionId.TRANSITION_CONFIGURE, TransitionId.TRANSITION_ACTIVATE),
+        TransitionId.TRANSITION_DEACTIVATE, StateId.PRIMARY_STATE_INACTIVE),
+    ((TransitionId.TRANSITION_CONFIGURE, TransitionId.TRANSITION_ACTIVATE),
+        TransitionId.TRANSITION_ACTIVE_SHUTDOWN, StateId.PRIMARY_STATE_FINALIZED),
+])
+def test_transition_success(start_transitions, transition_id, goal_state):
+    machine = Machine()
+    for start_transition in start_transitions:
+        assert run(machine, start_transition) == SUCCESS
+    assert run(machine, transition_id) == SUCCESS
+    assert machine.state == goal_state
+
+
+@pytest.mark.parametrize('name, transition_id, goal_state', [
+    ('configure', TransitionId.TRANSITION_CONFIGURE, StateId.PRIMARY_STATE_UNCONFIGURED),
+    ('activate', TransitionId.TRANSITION_ACTIVATE, StateId.PRIMARY_STATE_INACTIVE),
+])
+def test_transition_failure(name, transition_id, goal_state):
+    machine = Machine({name: FAILURE})
+    if transition_id == TransitionId.TRANSITION_ACTIVATE:
+        run(machine, TransitionId.TRANSITION_CONFIGURE)
+    assert run(machine, transition_id) == FAILURE
+    assert machine.state == goal_state
+    assert 'error' not in machine.calls
+
+
+@pytest.mark.parametrize('result', [ERROR, RuntimeError('boom'), 1234])
+def test_transition_error_goes_through_error_processing(result):
+    # Error codes, exceptions and unknown codes are all errors.
+    machine = Machine({'configure': result})
+    assert run(machine, TransitionId.TRANSITION_CONFIGURE) == (
+        result if isinstance(result, int) else ERROR)
+    assert machine.calls == ['configure', 'error']
+    assert machine.state == StateId.PRIMARY_STATE_UNCONFIGURED
+    assert goal_states(machine)[-3:] == [
+        StateId.TRANSITION_STATE_CONFIGURING,
+        StateId.TRANSITION_STATE_ERRORPROCESSING,
+        StateId.PRIMARY_STATE_UNCONFIGURED,
+    ]
+
+
+@pytest.mark.parametrize('error_result', [FAILURE, ERROR])
+def test_failed_error_processing_finalizes(error_result):
+    machine = Machine({'configure': ERROR, 'error': error_result})
+    run(machine, TransitionId.TRANSITION_CONFIGURE)
+    assert machine.state == StateId.PRIMARY_STATE_FINALIZED
+    assert machine.destroy() == SUCCESS
+
+
+def test_unknown_transition_is_rejected():
+    machine = Machine()
+    assert run(machine, TransitionId.TRANSITION_ACTIVATE) == FAILURE
+    assert machine.state == StateId.PRIMARY_STATE_UNCONFIGURED
+    assert machine.calls == []
+
+
+def test_any_shutdown_id_matches_the_current_state():
+    machine = Machine()
+    run(machine, TransitionId.TRANSITION_CONFIGURE)
+    assert run(machine, TransitionId.TRANSITION_UNCONFIGURED_SHUTDOWN) == SUCCESS
+    assert machine.state == StateId.PRIMARY_STATE_FINALIZED
+    assert machine.bus.history[-2].transition == TransitionId.TRANSITION_INACTIVE_SHUTDOWN
+
+
+def test_run_sync():
+    machine = LifecycleStateMachine()
+    machine.create()
+    assert run_sync(machine.go_to_state(StateId.PRIMARY_STATE_ACTIVE))
+    assert machine.state == StateId.PRIMARY_STATE_ACTIVE
+
+
+@pytest.mark.parametrize('start_state, goal_state, path', [
+    (StateId.PRIMARY_STATE_UNCONFIGURED, StateId.PRIMARY_STATE_UNCONFIGURED, ()),
+    (StateId.PRIMARY_STATE_UNCONFIGURED, StateId.PRIMARY_STATE_ACTIVE,
+        (TransitionId.TRANSITION_CONFIGURE, TransitionId.TRANSITION_ACTIVATE)),
+    (StateId.PRIMARY_STATE_ACTIVE, StateId.PRIMARY_STATE_UNCONFIGURED,
+        (TransitionId.TRANSITION_DEACTIVATE, TransitionId.TRANSITION_CLEANUP)),
+    (StateId.PRIMARY_STATE_ACTIVE, StateId.PRIMARY_STATE_FINALIZED,
+        (TransitionId.TRANSITION_ACTIVE_SHUTDOWN,)),
+    (StateId.PRIMARY_STATE_INACTIVE, StateId.PRIMARY_STATE_FINALIZED,
+        (TransitionId.TRANSITION_INACTIVE_SHUTDOWN,)),
+    (StateId.PRIMARY_STATE_FINALIZED, StateId.PRIMARY_STATE_ACTIVE, None),
+])
+def test_plan_transitions(start_state, goal_state, path):
+    assert plan_transitions(start_state, goal_state) == path
+
+
+def test_go_to_state_rejects_transition_states():
+    machine = Machine()
+    assert not run_sync(machine.go_to_state(StateId.TRANSITION_STATE_CONFIGURING))
+
+
+def test_go_to_state_last_writer_wins():
+    async def main():
+        gate = asyncio.Event()
+        machine = Machine(gate={'configure': gate})
+        first = asyncio.ensure_future(machine.go_to_state(StateId.PRIMARY_STATE_ACTIVE))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(machine.go_to_state(StateId.PRIMARY_STATE_UNCONFIGURED))
+        await asyncio.sleep(0)
+        gate.set()
+        return machine, await first, await second
+
+    machine, first, second = asyncio.run(main())
+    assert (first, second) == (False, True)
+    assert machine.calls == ['configure', 'cleanup']
+    assert machine.state == StateId.PRIMARY_STATE_UNCONFIGURED
+
+
+def test_go_to_state_waits_for_running_transition():
+    async def main():
+        gate = asyncio.Event()
+        machine = Machine(gate={'configure': gate})
+        configure = asyncio.ensure_future(
+            machine.apply_transition(TransitionId.TRANSITION_CONFIGURE))
+        await asyncio.sleep(0)
+        goal = asyncio.ensure_future(machine.go_to_state(StateId.PRIMARY_STATE_ACTIVE))
+        await asyncio.sleep(0)
+        assert machine.state == StateId.TRANSITION_STATE_CONFIGURING
+        gate.set()
+        return machine, await configure, await goal
+
+    machine, configure, goal = asyncio.run(main())
+    assert configure == SUCCESS
+    assert goal
+    assert machine.calls == ['configure', 'activate']
+    assert machine.state == StateId.PRIMARY_STATE_ACTIVE
+
+
+def test_transition_during_transition_is_rejected():
+    async def main():
+        gate = asyncio.Event()
+        machine = Machine(gate={'configure': gate})
+        configure = asyncio.ensure_future(
+            machine.apply_transition(TransitionId.TRANSITION_CONFIGURE))
+        await asyncio.sleep(0)
+        rejected = [
+            await machine.apply_transition(TransitionId.TRANSITION_CONFIGURE),
+            await machine.apply_transition(TransitionId.TRANSITION_ACTIVATE),
+            await machine.apply_transition(TransitionId.TRANSITION_UNCONFIGURED_SHUTDOWN),
+        ]
+        gate.set()
+        return machine, await configure, rejected
+
+    machine, configure, rejected = asyncio.run(main())
+    assert configure == SUCCESS
+    assert rejected == [FAILURE, FAILURE, FAILURE]
+    assert machine.calls == ['configure']
+    assert machine.state == StateId.PRIMARY_STATE_INACTIVE
@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from ros2_lifecycle_py import lifecycle_log_analyzer
+from ros2_lifecycle_py import lifecycle_recorder
+from ros2_lifecycle_py.lifecycle_core import StateId
+from ros2_lifecycle_py.lifecycle_core import TransitionId
+from ros2_lifecycle_py.lifecycle_recorder import RECORD
+from ros2_lifecycle_py.lifecycle_recorder import SEGMENT_HEADER
+from ros2_lifecycle_py.lifecycle_recorder import TransitionRecorder
+
+
+UNCONFIGURED = StateId.PRIMARY_STATE_UNCONFIGURED
+CONFIGURING = StateId.TRANSITION_STATE_CONFIGURING
+INACTIVE = StateId.PRIMARY_STATE_INACTIVE
+ERRORPROCESSING = StateId.TRANSITION_STATE_ERRORPROCESSING
+
+
+@pytest.fixture(params=['numpy', 'struct'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy' and lifecycle_recorder.numpy is None:
+        pytest.skip('numpy is not available')
+    if request.param == 'struct':
+        monkeypatch.setattr(lifecycle_recorder, 'numpy', None)
+        monkeypatch.setattr(lifecycle_log_analyzer, 'numpy', None)
+    return request.param
+
+
+def configure(recorder, node_id, timestamp, result=TransitionId.TRANSITION_ON_CONFIGURE_SUCCESS):
+    recorder.record(
+        timestamp, node_id, TransitionId.TRANSITION_CONFIGURE, UNCONFIGURED, CONFIGURING)
+    goal = {
+        TransitionId.TRANSITION_ON_CONFIGURE_SUCCESS: INACTIVE,
+        TransitionId.TRANSITION_ON_CONFIGURE_FAILURE: UNCONFIGURED,
+        TransitionId.TRANSITION_ON_CONFIGURE_ERROR: ERRORPROCESSING,
+    }[result]
+    recorder.record(timestamp + 100, node_id, result, CONFIGURING, goal, 50)
+
+
+def load(directory):
+    node_names, records = lifecycle_log_analyzer.load(directory)
+    return node_names, [tuple(record) for record in lifecycle_log_analyzer.rows(records)]
+
+
+def test_record_and_load(tmp_path, backend):
+    recorder = TransitionRecorder(str(tmp_path))
+    talker = recorder.register_node('/talker')
+    listener = recorder.register_node('/listener')
+    assert recorder.register_node('/talker') == talker
+    configure(recorder, listener, 2000)
+    configure(recorder, talker, 1000)
+    recorder.close()
+
+    node_names, records = load(str(tmp_path))
+    assert sorted(node_names) == ['/listener', '/talker']
+    assert records == sorted(records, key=lambda record: (record[1], record[0]))
+    assert sorted((node_names[record[1]], record[0]) for record in records) == [
+        ('/listener', 2000), ('/listener', 2100), ('/talker', 1000), ('/talker', 1100),
+    ]
+    assert records[node_names.index('/talker') * 2 + 1][2:] == (
+        TransitionId.TRANSITION_ON_CONFIGURE_SUCCESS, CONFIGURING, INACTIVE, 50)
+
+
+def test_runs_do_not_overwrite_each_other(tmp_path, backend):
+    # Same pid for both runs, as after a restart in a container.
+    first = TransitionRecorder(str(tmp_path))
+    configure(first, first.register_node('/old_run_node'), 1000)
+    first.close()
+    second = TransitionRecorder(str(tmp_path))
+    configure(second, second.register_node('/new_run_node'), 2000)
+    second.close()
+
+    assert first.run != second.run
+    node_names, records = load(str(tmp_path))
+    assert sorted(node_names) == ['/new_run_node', '/old_run_node']
+    assert sorted((node_names[record[1]], record[0]) for record in records) == [
+        ('/new_run_node', 2000), ('/new_run_node', 2100),
+        ('/old_run_node', 1000), ('/old_run_node', 1100),
+    ]
+
+
+def test_segments_roll_over(tmp_path, backend):
+    recorder = TransitionRecorder(
+        str(tmp_path), segment_size=SEGMENT_HEADER.size + 2 * RECORD.size, max_segments=2)
+    node_id = recorder.register_node('/talker')
+    for timestamp in range(1000, 4000, 1000):
+        configure(recorder, node_id, timestamp)
+    recorder.close()
+
+    assert len(lifecycle_recorder.segment_paths(str(tmp_path))) == 2
+    _, records = load(str(tmp_path))
+    assert [record[0] for record in records] == [2000, 2100, 3000, 3100]
+
+
+def test_unknown_node_ids_are_skipped(tmp_path, backend):
+    recorder = TransitionRecorder(str(tmp_path))
+    configure(recorder, recorder.register_node('/talker'), 1000)
+    configure(recorder, 7, 2000)
+    recorder.close()
+
+    node_names, records = load(str(tmp_path))
+    assert node_names == ['/talker']
+    assert [record[0] for record in records] == [1000, 1100]
+
+
+def test_summarize(tmp_path, backend):
+    recorder = TransitionRecorder(str(tmp_path))
+    node_id = recorder.register_node('/talker')
+    configure(recorder, node_id, 1000, TransitionId.TRANSITION_ON_CONFIGURE_FAILURE)
+    configure(recorder, node_id, 2000, TransitionId.TRANSITION_ON_CONFIGURE_ERROR)
+    recorder.record(2200, node_id, TransitionId.TRANSITION_ON_ERROR_SUCCESS,
+                    ERRORPROCESSING, UNCONFIGURED)
+    configure(recorder, node_id, 3000)
+    recorder.close()
+
+    node_names, records = lifecycle_log_analyzer.load(str(tmp_path))
+    summary = lifecycle_log_analyzer.summarize(len(node_names), records)
+    assert [int(summary[key][0]) for key in ('results', 'failures', 'errors')] == [4, 1, 1]
+    assert {state: int(elapsed) for state, elapsed in summary['time_in_state'][0].items()} == {
+        CONFIGURING: 300,
+        ERRORPROCESSING: 100,
+        UNCONFIGURED: 1700,
+    }
+
+
+def test_main(tmp_path, backend, capsys):
+    recorder = TransitionRecorder(str(tmp_path))
+    configure(recorder, recorder.register_node('/talker'), 1000)
+    configure(recorder, recorder.register_node('/listener'), 1000)
+    recorder.close()
+
+    lifecycle_log_analyzer.main([str(tmp_path), '--node', '/talk*', '--timeline'])
+    out = capsys.readouterr().out
+    assert 'TRANSITION_CONFIGURE: PRIMARY_STATE_UNCONFIGURED' in out
+    assert '/talker: 1 transitions, 0 failures, 0 errors' in out
+    assert '/listener' not in out
+
+
+def test_read_segment_rejects_other_files(tmp_path):
+    path = os.path.join(str(tmp_path), 'transitions_1-1_000000.lclog')
+    with open(path, 'wb') as f:
+        f.write(b'\0' * (SEGMENT_HEADER.size + RECORD.size))
+    with pytest.raises(ValueError):
+        lifecycle_recorder.read_segment(path)